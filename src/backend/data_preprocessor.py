@@ -1,28 +1,122 @@
 """Data preprocessor file containing the data preprocessor class which is
 used for processing data in the backend before sending it to the Vue frontend."""
 import base64
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
 
+import grpc
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image
+from scipy.signal import lfilter
 import tensorboard.plugins.image.metadata as meta_image
 import tensorboard.plugins.scalar.metadata as meta_scalar
 from tensorboard import context
+from tensorboard import data_compat
+from tensorboard.compat.proto import event_pb2
 from tensorboard.backend.event_processing import data_provider
+from tensorboard.backend.event_processing import io_wrapper
 from tensorboard.backend.event_processing import \
     plugin_event_multiplexer as event_multiplexer
+from tensorboard.data import grpc_provider
 from tensorboard.data import provider as base_provider
+from tensorboard.data import server_ingester
+from tensorboard.util import tensor_util
 import re
-import timeit
+import shutil
 
 
 class DataPreprocessor:
     """The DataPreprocessor class is there for preprocessing the data coming
         from log files before sending back processed data to the frontend."""
 
-    def __init__(self, log_dir):
+    ANIMATION_FORMATS = {'gif': 'GIF', 'webp': 'WEBP'}
+    # maximum edge lengths in pixels of the thumbnails of random state samples
+    THUMBNAIL_SIZES = (16, 32, 48, 64)
+    # smoother name -> default smoothing parameter (degree, alpha or window size)
+    SMOOTHERS = {'polyfit': 5, 'ema': 0.1,
+                 'rolling_mean': 10, 'rolling_median': 10}
+    DOWNSAMPLERS = ('lttb', 'minmax')
+    ARRAY_ENCODINGS = ('float32', 'float16')
+    DISTRIBUTION_AGGREGATES = ('sum', 'mean')
+    # tags of timestep level scalars are of the form {metric}-e{episode}
+    TIMESTEP_TAG_PATTERN = re.compile(r"(.+)-e(\d+)$")
+    FRAME_TAG_PATTERN = re.compile(r"episode(\d+)$")
+    # episode level scalar tags -> column of the episode table, other tags keep their name
+    EPISODE_TABLE_TAGS = {'episode-rewards': 'return', 'action-divergences': 'divergence'}
+    # predicates on the episode table are of the form {column}{operator}{number}, e.g. return>10
+    EPISODE_PREDICATE_PATTERN = re.compile(r"^\s*([^<>=!\s]+)\s*(<=|>=|==|!=|<|>)\s*(\S+)\s*$")
+    EPISODE_PREDICATE_OPERATORS = {'<': np.less, '<=': np.less_equal, '>': np.greater,
+                                   '>=': np.greater_equal, '==': np.equal, '!=': np.not_equal}
+
+    def __init__(self, log_dir, cache_dir=None, load_workers=1, backend=None, memory_budget=None):
         self.log_dir = log_dir
-        self.inf = 1000000000
-        self. ctx = context.RequestContext()
-        self.provider = self._create_provider()
+        self.load_workers = load_workers
+        # without a shared budget the memory usage is only tracked
+        self.memory_budget = memory_budget if memory_budget is not None else MemoryBudget()
+        if backend is None:
+            # only the columnar backend can spill its data to stay within a memory limit
+            backend = 'columnar' if load_workers > 1 or self.memory_budget.limit is not None \
+                else 'multiplexer'
+        self.backend_name = backend
+        if cache_dir is None:
+            cache_dir = os.path.join(tempfile.gettempdir(), "drlvis-cache")
+        # one cache directory per logdir, so servers for different logdirs don't collide
+        self.cache_dir = os.path.join(cache_dir, hashlib.sha1(
+            os.path.abspath(log_dir).encode('utf-8')).hexdigest()[:16])
+        self.data_cache_dir = self._get_data_cache_dir()
+        # renderings of data, which was replaced since the last start (e.g. retrained into the
+        # same logdir), are never used again
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if os.path.join(self.cache_dir, name) != self.data_cache_dir:
+                    shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+        # incremented on every reload, cached data of older versions gets updated lazily
+        self.data_version = 0
+        # incremented on reloads which found new data, see get_data_etag
+        self.content_version = 0
+        self._tag_versions = {}
+        # distinguishes the versions of this instance from the ones of earlier server processes
+        self._instance_id = uuid.uuid4().hex
+        self._scalar_series = {}
+        self._cache = {}
+        # requests are answered concurrently, one lock per cache key (see _get_lock) serializes
+        # the computation and the incremental updates of a cached value
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.tag_index = {}
+        self.episode_table = {}
+        self._episode_metrics = {}
+        self._confidence_samples = {}
+        self.backend = self._create_backend()
+        self._build_tag_index()
+        self._build_pyramids()
+        self._build_episode_table()
+
+    def reload(self):
+        """A method to load data which was logged since the last (re)load.
+        Cached series are not recomputed here but extended on their next request,
+        only the scalar pyramids and the episode table are extended right away."""
+        with self._reload_lock:
+            self.backend.reload()
+            self.data_version += 1
+            self.data_cache_dir = self._get_data_cache_dir()
+            self._build_tag_index()
+            self._build_pyramids()
+            self._build_episode_table()
 
     def get_timestep_log_tags(self):
         """return a list of scalar logtags on a timestep level for e.g. rewards, q-values,...
@@ -31,20 +125,8 @@ class DataPreprocessor:
                 A dict of the form {"timestep_log_tags": list(string)}, where the list of strings are
                 the scalar log tags for logged timestep values like rewards...
         """
-        timestep_log_tags = {}
-        try:
-            log_tags_list = list(self.provider.list_scalars(
-                experiment_id="unused", ctx=self.ctx, plugin_name=meta_scalar.PLUGIN_NAME)['.'].keys())
-            timestep_log_tags_filtered = set()
-            for logged_scalar in log_tags_list:
-                valid_pattern = re.compile(".*-e\d+")
-                if valid_pattern.match(logged_scalar) and "reward" not in logged_scalar:
-                    timestep_log_tags_filtered.add(logged_scalar.split("-")[0])
-            timestep_log_tags["timestepLogTags"] = list(
-                timestep_log_tags_filtered)
-        except KeyError:
-            print("Tags for logged scalars on a timestep level do not exist")
-        return timestep_log_tags
+        return {"timestepLogTags": [metric for metric in self.tag_index['timestepTags']
+                                    if "reward" not in metric]}
 
     def get_log_tags(self):
         """return a list of tags that were used during logging of scalar values like episode returns
@@ -53,49 +135,247 @@ class DataPreprocessor:
                 A dict of the form {"logTags": list(string)} where the strings inside of the list
                 are the log tags.
         """
-        log_tags = {}
-        try:
-            log_tags_list = list(self.provider.list_scalars(
-                experiment_id="unused", ctx=self.ctx, plugin_name=meta_scalar.PLUGIN_NAME)['.'].keys())
-            log_tags_list_filtered = []
-            for logged_scalar in log_tags_list:
-                non_valid_pattern = re.compile(".*-e\d+")
-                if non_valid_pattern.match(logged_scalar) or logged_scalar in ["action-divergences", "episode-rewards"]:
-                    continue
-                log_tags_list_filtered.append(logged_scalar)
-            log_tags["logTags"] = log_tags_list_filtered
-        except KeyError:
-            print("Tags for logged scalars do not exist")
-        return log_tags
+        return {"logTags": [tag for tag in self.tag_index['episodeTags']
+                            if tag not in ["action-divergences", "episode-rewards"]]}
+
+    def get_tag_index(self):
+        """A method to return the index of all logged tags, which is built at load and
+        updated on every reload.
+        Returns:
+            tag_index: dict
+                A dict of the form {"scalars": {tag: {"maxStep": int, "wallTime": float}},
+                "episodeTags": list, "timestepTags": {metric: {"episodes": list, "maxSteps": list}},
+                "frameEpisodes": list, "plugins": list}. episodeTags are the scalar tags logged per
+                episode, timestepTags the metrics logged per timestep with the sorted episodes they
+                were logged in and the last logged timestep per episode. frameEpisodes are the
+                sorted episodes with logged frames.
+        """
+        return self.tag_index
+
+    def get_data_etag(self, request_key, tags=None):
+        """A method to return an ETag for a response, which only depends on the request and on
+        the data logged under some tags. The ETag changes once new data is logged under one of the
+        tags, so unchanged responses can be revalidated without computing them again.
+        Params:
+            request_key: string
+                Identifies the request, e.g. its path and query string.
+            tags: list
+                The tags the response is computed from, None if it depends on all data of the run.
+        Returns:
+            etag: string
+        """
+        if tags is None:
+            version = self.content_version
+        else:
+            version = [self._tag_versions.get(tag) for tag in tags]
+        return hashlib.sha1(json.dumps([self._instance_id, self.log_dir, request_key, version])
+                            .encode('utf-8')).hexdigest()
+
+    def get_memory_usage(self):
+        """A method to return the memory usage tracked by the memory budget of the run, which is
+        shared by all runs loaded together.
+        Returns:
+            memory_usage: dict
+                See MemoryBudget.get_usage.
+        """
+        return self.memory_budget.get_usage()
+
+    def release(self, key):
+        """A method to drop a cached value, called by the memory budget to evict it.
+        Params:
+            key: tuple
+                The key of the cached value.
+        """
+        self._cache.pop(key, None)
+
+    def get_episode_table(self, columns=None, sort_by='episode', descending=False, offset=0,
+                          limit=None, from_episode=None, to_episode=None, predicates=None):
+        """A method to return rows of the episode table, which holds one row of facts per
+        episode and is updated on every reload. Its columns are the episode, return, length
+        (number of logged timesteps), totalSteps (timesteps up to the end of the episode),
+        divergence, actionEntropy (of the action distribution), one column per other episode
+        level scalar tag (e.g. loss) and the mean of every timestep level metric as
+        {metric}Mean (e.g. qvalueMean). Facts which were not logged are None.
+        Params:
+            columns: list
+                The names of the returned columns, None for all columns.
+            sort_by: string
+                The column the rows are sorted by, missing values are sorted last.
+            descending: bool
+                Whether to sort in descending order.
+            offset: int
+                The number of sorted rows skipped for paging.
+            limit: int
+                The maximum number of returned rows, None for all rows.
+            from_episode: int
+                The first episode (inclusive) of the table, None for the first episode.
+            to_episode: int
+                The last episode (inclusive) of the table, None for the last episode.
+            predicates: list
+                Only rows matching all predicates are returned, see query_episodes.
+        Returns:
+            episode_table: dict
+                A dict of the form {"columns": list, "rows": [[value per column] per row],
+                "total": int}, where total is the number of matching rows before paging.
+        Raises:
+            ValueError: for unknown columns or invalid predicates
+        """
+        table = self.episode_table
+        columns = list(table) if columns is None else list(columns)
+        unknown_columns = [column for column in columns + [sort_by] if column not in table]
+        if unknown_columns:
+            raise ValueError("Unknown episode table columns " + ", ".join(unknown_columns))
+
+        rows = np.flatnonzero(self._get_episode_mask(table, predicates, from_episode, to_episode))
+        sort_values = table[sort_by][rows]
+        # negated for descending order, so missing (nan) values stay last
+        order = rows[np.argsort(-sort_values if descending else sort_values, kind='stable')]
+        page = order[offset:None if limit is None else offset + limit]
 
-    def get_scalar_values_by_tag(self, tag):
+        column_values = []
+        for column in columns:
+            values = table[column][page]
+            missing = np.isnan(values) if values.dtype.kind == 'f' else np.zeros(len(values), dtype=bool)
+            column_values.append([None if is_missing else value
+                                  for value, is_missing in zip(values.tolist(), missing.tolist())])
+        return {'columns': columns,
+                'rows': [list(row) for row in zip(*column_values)],
+                'total': len(rows)}
+
+    def query_episodes(self, predicates=None, from_episode=None, to_episode=None, limit=None):
+        """A method to find the episodes matching simple predicates on the episode table
+        (see get_episode_table), e.g. to find interesting episodes without loading them.
+        Params:
+            predicates: list
+                Strings of the form {column}{operator}{number} with one of the operators
+                <, <=, >, >=, == and !=, e.g. ["return>10", "length<200"]. Episodes with a missing
+                value in a compared column never match.
+            from_episode: int
+                The first episode (inclusive), None for the first episode.
+            to_episode: int
+                The last episode (inclusive), None for the last episode.
+            limit: int
+                The maximum number of returned episodes, None for all.
+        Returns:
+            episodes: dict
+                A dict of the form {"episodes": list, "total": int} with the sorted matching
+                episodes and their number before the limit.
+        Raises:
+            ValueError: for invalid predicates or unknown columns
+        """
+        table = self.episode_table
+        episodes = table['episode'][self._get_episode_mask(table, predicates, from_episode, to_episode)]
+        return {'episodes': episodes[:limit].tolist(), 'total': len(episodes)}
+
+    def get_metric_episodes(self, metric):
+        """A method to return the episodes in which a timestep level metric was logged.
+        Params:
+            metric: string
+                The metric, e.g. reward for the tags reward-e{episode}.
+        Returns:
+            episodes: list
+                The sorted episodes, an empty list for unknown metrics.
+        """
+        return self.tag_index['timestepTags'].get(metric, {}).get('episodes', [])
+
+    def get_scalar_values_by_tag(self, tag, smoother='polyfit', smoothing=None, max_points=None,
+                                 downsampler='lttb'):
         """A method to get scalar values by one single tag.
         Params:
             tag: string
             A simple string containing the tag of which the values (step, value) shall be returned
+            smoother: string
+            The smoother used for the trend, one of SMOOTHERS
+            smoothing: number
+            The parameter of the smoother: the degree for polyfit, alpha (0 < alpha <= 1) for ema
+            and the window size for rolling_mean and rolling_median, the degree and the window size
+            are integers between 1 and the number of values. Defaults to SMOOTHERS[smoother]
+            max_points: int
+            The maximum number of returned values, None returns all values. The trend
+            is computed on all values before downsampling.
+            downsampler: string
+            One of DOWNSAMPLERS, lttb (largest triangle three buckets) keeps the visual
+            shape, minmax keeps the minimum and maximum value per bucket
         Returns:
             scalar_listing:
-                The values {step: [val, polyfittrend]) filtered by the tag.
+                The values {step: [val, trend]) filtered by the tag.
+        Raises:
+            ValueError: for a smoothing out of the range of the smoother
         """
-        scalars = self._get_scalars_by_tag(tag)
-        if scalars == {}:
+        series = self._get_scalar_series(tag)
+        if series is None:
             print("Scalar value queried by"+str(tag)+" does not exist.")
             return {}
 
-        scalar_listing = {}
-        for scalar in scalars:
-            scalar_listing[scalar.step] = scalar.value
-        scalar_dict_vals = np.array(list(scalar_listing.values()))
+        steps = series['steps']
+        values = np.column_stack(
+            [series['values'], self._get_trend(series, smoother, smoothing)])
+        if max_points is not None and len(steps) > max_points:
+            if downsampler == 'minmax':
+                indices = self._min_max_indices(series['values'], max_points)
+            else:
+                indices = self._lttb_indices(steps, series['values'], max_points)
+            steps = steps[indices]
+            values = values[indices]
+        return dict(zip(steps.tolist(), values.tolist()))
+
+    def get_scalar_range(self, tag, from_step=None, to_step=None, max_points=1000):
+        """A method to get aggregated scalar values of a step range for zoomable charts.
+        The aggregates are read from the level of the scalar pyramid with the smallest buckets,
+        which returns at most max_points buckets, so the costs only depend on max_points.
+        Params:
+            tag: string
+                The tag of the scalar values.
+            from_step: int
+                The first step (inclusive) of the range, None for the beginning.
+            to_step: int
+                The last step (inclusive) of the range, None for the end.
+            max_points: int
+                The maximum number of returned buckets.
+        Returns:
+            scalar_range: dict
+                A dict of the form {"bucketSize": int, "steps": list, "min": list, "max": list,
+                "mean": list, "count": list} with one entry per bucket, where the step is the
+                first step in a bucket. Buckets at the borders of the range can contain values
+                outside of the range.
+        """
+        pyramid = self._get_pyramid(tag)
+        if pyramid is None:
+            print("Scalar value queried by"+str(tag)+" does not exist.")
+            return {}
 
-        polynomial_fit = np.polyfit(
-            np.arange(len(scalar_dict_vals)), scalar_dict_vals, 5)
-        poly_handler = np.poly1d(polynomial_fit)
+        steps = self._scalar_series[tag]['steps']
+        first = 0 if from_step is None else int(np.searchsorted(steps, from_step, 'left'))
+        last = len(steps) if to_step is None else int(np.searchsorted(steps, to_step, 'right'))
+        if first >= last:
+            return {'bucketSize': 1, 'steps': [], 'min': [], 'max': [], 'mean': [], 'count': []}
 
-        for index, scalar in enumerate(scalars):
-            scalar_listing[scalar.step] = [
-                scalar.value, poly_handler(index)]
+        level_num = 0
+        while ((last - 1) >> level_num) - (first >> level_num) + 1 > max_points \
+                and level_num + 1 < len(pyramid):
+            level_num += 1
+        level = pyramid[level_num]
+        buckets = slice(first >> level_num, ((last - 1) >> level_num) + 1)
+        return {'bucketSize': 1 << level_num,
+                'steps': steps[(np.arange(buckets.start, buckets.stop) << level_num)].tolist(),
+                'min': level['min'][buckets].tolist(),
+                'max': level['max'][buckets].tolist(),
+                'mean': (level['sum'][buckets] / level['count'][buckets]).tolist(),
+                'count': level['count'][buckets].tolist()}
 
-        return scalar_listing
+    def get_scalar_arrays(self, tag):
+        """A method to return the steps and values of a scalar series as numpy arrays.
+        Params:
+            tag: string
+                The tag of the scalar values.
+        Returns:
+            steps, values: (np.ndarray, np.ndarray)
+                The steps and values, (None, None) if the tag does not exist.
+        """
+        series = self._get_scalar_series(tag)
+        if series is None:
+            return None, None
+        return series['steps'], series['values']
 
     def get_all_scalar_values(self):
         """A method for returning all scalar values from the log file.
@@ -103,15 +383,11 @@ class DataPreprocessor:
             all_values: all scalar values logged in the log file without any filter tags.
         """
         all_values = {}
-        try:
-            all_tags = list(self.provider.list_scalars(
-                self.ctx, plugin_name=meta_scalar.PLUGIN_NAME, experiment_id="unused",
-                run_tag_filter=None)['.'].keys())
-            all_values = {tag: [] for tag in all_tags}
-            for tag in all_tags:
-                all_values[tag] = self.get_scalar_values_by_tag(tag)
-        except KeyError:
+        all_tags = list(self.backend.list_tags(meta_scalar.PLUGIN_NAME))
+        if not all_tags:
             print("The requestet scalar value list does not exist.")
+        for tag in all_tags:
+            all_values[tag] = self.get_scalar_values_by_tag(tag)
         return all_values
 
     def get_multiple_scalar_values_by_tag(self, tags):
@@ -139,71 +415,171 @@ class DataPreprocessor:
             frames: The frames per episode as binary data
         """
         frames = {'frames': []}
-        try:
-            images = self.provider.read_blob_sequences(
-                self.ctx, plugin_name=meta_image.PLUGIN_NAME, experiment_id="unused",
-                downsample=self.inf)['.']
-
-            for vals in images['episode{}'.format(episode_num)]:
-                for index, tuple_vals in enumerate(vals.values):
-                    if index == 2:
-                        frame_raw = self.provider.read_blob(
-                            self.ctx, blob_key=tuple_vals.blob_key)
-                        frame_raw = base64.b64encode(frame_raw).decode('ascii')
-                        frames['frames'].append(frame_raw)
-
-        except KeyError:
-            print("The requested frames do not exist.")
+        for _, frame_raw in self.get_frames_in_range(episode_num):
+            frames['frames'].append(base64.b64encode(frame_raw).decode('ascii'))
         return frames
 
-    def get_probs_for_episode(self, episode_num):
+    def get_frame(self, episode_num, step):
+        """A method to get a single recorded frame as raw png data.
+        Params:
+            episode_num: int
+                The episode in which the frame was logged.
+            step: int
+                The timestep within the episode at which the frame was logged.
+        Returns:
+            frame_raw: bytes
+                The png encoded frame or None if it does not exist.
+        """
+        for frame_step, blob_key in self._get_image_blob_keys('episode{}'.format(episode_num)):
+            if frame_step == step:
+                return self.backend.read_blob(blob_key)
+        print("The requested frame does not exist.")
+        return None
+
+    def get_frames_in_range(self, episode_num, from_step=0, to_step=None):
+        """A method to get the raw png frames of an episode within a range of timesteps.
+        Params:
+            episode_num: int
+                The episode in which the frames were logged.
+            from_step: int
+                The first timestep (inclusive) of the requested range.
+            to_step: int
+                The last timestep (inclusive) of the requested range, None for the
+                end of the episode.
+        Returns:
+            frames: list
+                A list of (step, png bytes) tuples ordered by step.
+        """
+        frames = []
+        for frame_step, blob_key in self._get_image_blob_keys('episode{}'.format(episode_num)):
+            if frame_step < from_step or (to_step is not None and frame_step > to_step):
+                continue
+            frames.append((frame_step, self.backend.read_blob(blob_key)))
+        return frames
+
+    def get_episode_animation(self, episode_num, fmt='webp', from_step=0, to_step=None, fps=30):
+        """A method to render the frames of an episode into a single animated image.
+        Animations of complete episodes are cached on disk, so they are only rendered once.
+        Params:
+            episode_num: int
+                The episode which shall be rendered.
+            fmt: string
+                The animation format, one of ANIMATION_FORMATS.
+            from_step: int
+                The first timestep (inclusive) of the animation.
+            to_step: int
+                The last timestep (inclusive) of the animation, None for the end of the episode.
+            fps: int
+                The frames per second of the animation.
+        Returns:
+            animation: bytes
+                The encoded animation or None if there are no frames in the given range.
+        """
+        cache_path = os.path.join(self.data_cache_dir, 'animations', 'episode-{}-{}-{}-{}.{}'.format(
+            episode_num, from_step, 'end' if to_step is None else to_step, fps, fmt))
+        if os.path.exists(cache_path):
+            with open(cache_path, 'rb') as cache_file:
+                return cache_file.read()
+
+        frames = [Image.open(io.BytesIO(frame_raw)) for _, frame_raw in
+                  self.get_frames_in_range(episode_num, from_step, to_step)]
+        if not frames:
+            print("The requested frames do not exist.")
+            return None
+        animation = io.BytesIO()
+        frames[0].save(animation, format=self.ANIMATION_FORMATS[fmt], save_all=True,
+                       append_images=frames[1:], duration=max(1, 1000 // fps), loop=0)
+        animation = animation.getvalue()
+
+        if self.is_episode_complete(episode_num):
+            self._write_cache_file(cache_path, animation)
+        return animation
+
+    def is_episode_complete(self, episode_num):
+        """A method to check whether an episode has finished logging. An episode is
+        complete, once its return was logged or data for a later episode exists.
+        Data of complete episodes never changes, which allows clients to cache it forever.
+        Params:
+            episode_num: int
+                The episode to check.
+        Returns:
+            complete: bool
+        """
+        rewards = self.tag_index['scalars'].get('episode-rewards')
+        if rewards is not None and rewards['maxStep'] >= episode_num:
+            return True
+        frame_episodes = self.tag_index['frameEpisodes']
+        return bool(frame_episodes) and frame_episodes[-1] > episode_num
+
+    def get_probs_for_episode(self, episode_num, columnar=False, encoding=None,
+                              entropy=False, argmax=False):
         """A method for returning the probabilities per timestep predicted
             by softmax layer in the network.
         Params:
             episode_num: int
             The episode number to get the probabilities from.
+            columnar: bool
+            Whether to return the probabilities as one [timesteps, actions] matrix
+            instead of a list of {name, value} dicts per timestep
+            encoding: string
+            One of ARRAY_ENCODINGS to return the columnar matrix and columns as base64
+            encoded buffers (see _encode_array) instead of nested lists, implies columnar
+            entropy: bool
+            Whether to add the entropy of the probabilities per timestep (columnar only)
+            argmax: bool
+            Whether to add the most probable action per timestep (columnar only)
         Returns:
             probs: the probabilities predicted by the agent per timestep
+                or for columnar {"actions": list, "steps": list, "probs": matrix} and
+                optionally "entropy" and "argmax" columns
 
         """
-        probs = {}
-        try:
-            episode_probs = self.provider.read_tensors(self.ctx, experiment_id="unused",
-                                                       downsample=self.inf,
-                                                       plugin_name="action_probs")[
-                '.']['e{}'.format(episode_num)]
-            for f_index, frame_probs_wrapped in enumerate(episode_probs):
-                frame_probs_unwrapped = frame_probs_wrapped.numpy
-
-                probs[f_index] = [{"name": "action{}".format(
-                    i), "value": float(val)} for i, val in enumerate(list(frame_probs_unwrapped))]
-        except KeyError:
+        steps, episode_probs = self._get_probs_tensor(episode_num)
+        if episode_probs is None:
             print(
                 "The requested action probabilities (confidence)\
                 do not exist for the given episode.")
+            return {}
+        action_names = ["action{}".format(i) for i in range(episode_probs.shape[1])]
+
+        if not columnar and encoding is None:
+            return {f_index: [{"name": name, "value": value} for name, value in zip(action_names, frame_probs)]
+                    for f_index, frame_probs in enumerate(episode_probs.tolist())}
+
+        def encode(array):
+            return array.tolist() if encoding is None else self._encode_array(array, encoding)
+        probs = {'actions': action_names, 'steps': steps.tolist(), 'probs': encode(episode_probs)}
+        if entropy:
+            safe_probs = np.where(episode_probs > 0, episode_probs, 1)
+            probs['entropy'] = encode(-np.sum(episode_probs * np.log(safe_probs), axis=1))
+        if argmax:
+            probs['argmax'] = np.argmax(episode_probs, axis=1).tolist()
         return probs
 
     def get_first_confidence_experiment_episode(self):
         conf_episode = -1
-        try:
-            experiment_ids = self.provider.list_tensors(
-                experiment_id='unused', ctx=self.ctx,
-                plugin_name='experiment_random_states')['.'].keys()
-
-            experiment_ids_numerical = [int(experiment_id.split(
-                '-')[-1]) for experiment_id in experiment_ids]
-            conf_episode = experiment_ids_numerical[0]
-
-        except KeyError:
+        experiment_episodes = self._get_experiment_episodes()
+        if experiment_episodes:
+            conf_episode = experiment_episodes[0]
+        else:
             print("First conifdence episode does not exist")
         return conf_episode
 
-    def get_experiment_random_states_tensors(self, episode_num):
+    def get_experiment_random_states_tensors(self, episode_num, encoding=None, max_points=None,
+                                             grid_size=64):
         """A method to return data for the random state experiment. (Experiment to test agent's
             confidence in selecting the right actions in given random states.)
         Params:
             episode_num: int
                 The episode number for which the data is being requested
+            encoding: string
+                None for row wise values or one of ARRAY_ENCODINGS for columnar values
+            max_points: int
+                If the experiment has more samples, the samples are aggregated into the cells of
+                a grid_size x grid_size grid over the reduced dimensions instead (see
+                _get_experiment_grid), None to always return every sample.
+            grid_size: int
+                The number of cells per dimension of the aggregation grid.
         Returns:
             exp_data: dict
                 A dictionary containing the relevant data for the given experiment. It consists
@@ -211,128 +587,196 @@ class DataPreprocessor:
                 , a step, which is the number of episodes between experiment episodes, a min and
                 max State indicating the value of maximum and minimum state values (environment
                 bounds), and the values which are a high dimensional array containing the following
-                columns: [reduced_dim1, reduced_dim2, predicted_actions, entropy_on_predictions,
+                columns: [reduced_dim1, reduced_dim2, predicted_actions, confidence_on_predictions,
                 actual_state_val1, ..., actual_state_valn]
+                With an encoding, the values are replaced by columns, a list with one encoded
+                buffer per column in the same order (see _encode_array).
+                Aggregated experiments have a grid of the form {"size": int, "numPoints": int,
+                "xRange": [min, max], "yRange": [min, max], "cellX": list, "cellY": list,
+                "counts": list, "meanConfidence": list, "majorityAction": list} with one entry
+                per non empty cell instead of the values.
 
         """
-        exp_data = {}
-        try:
-            experiment_ids = self.provider.list_tensors(
-                experiment_id='unused', ctx=self.ctx,
-                plugin_name='experiment_random_states')['.'].keys()
-
-            experiment_ids_numerical = [int(experiment_id.split(
-                '-')[-1]) for experiment_id in experiment_ids]
-            exp_data['minEpisode'] = experiment_ids_numerical[0]
-            exp_data['maxEpisode'] = experiment_ids_numerical[-1]
-
-            if len(experiment_ids_numerical) >= 2:
-                exp_data['step'] = experiment_ids_numerical[1] - \
-                    experiment_ids_numerical[0]
-            else:
-                exp_data['step'] = 0
-            bound_data = self.provider.read_tensors(experiment_id='unused',
-                                                    plugin_name='experiment_random_states_bounds',
-                                                    ctx=self.ctx, downsample=self.inf)['.']['experiment-episode-{}-bounds'.format(episode_num)][0].numpy
-
-            # state_names = self.provider.read_tensors(experiment_id='unused',
-            #                                          plugin_name='experiment_random_states_state_meanings',
-            #                                          ctx=self.ctx, downsample=self.inf)['.']['experiment-episode-{}-state-meaning'.format(episode_num)][0].numpy
-           # print(state_names)
-            exp_data['minState'] = bound_data[0, :].tolist()
-            exp_data['maxState'] = bound_data[1, :].tolist()
-
-            data_values = self.provider.read_tensors(experiment_id='unused',
-                                                     plugin_name='experiment_random_states',
-                                                     ctx=self.ctx, downsample=self.inf)[
-                '.']['experiment-episode-{}'.format(episode_num)][0].numpy
-            x_vals = data_values[:, 0].tolist()
-
-            y_vals = data_values[:, 1].tolist()
-
-            action_preds = data_values[:, 2].tolist()
-
-            entropy_preds = data_values[:, 3]
-           # print(entropy_preds)
-
-            exp_vals = []
-            entropy_preds = (np.ones_like(entropy_preds) - ((entropy_preds - entropy_preds.min()) /  # calculate 1-entropy to get confidence of being correct prediction
-                                                            (entropy_preds.max() - entropy_preds.min()))).tolist()
-            # entropy_preds = np.ones_like(entropy_preds).tolist()
-            rest = data_values[:, 4:]
-            state_info = []
-            for i in range(4, 4+rest.shape[1]):
-                state_info.append(data_values[:, i].tolist())
-
-            for exp_entry in zip(x_vals, y_vals, action_preds, entropy_preds, *state_info):
-                exp_vals.append(list(exp_entry))
-            exp_data['values'] = exp_vals
-            print("done with experiment data")
-
-        except KeyError:
+        exp_data = self._cached(
+            ('experiment_random_states', episode_num, encoding, max_points, grid_size),
+            lambda: self._prepare_experiment_data(episode_num, encoding, max_points, grid_size),
+            ['experiment-episode-{}'.format(episode) for episode in self._get_experiment_episodes()]
+            + ['experiment-episode-{}-bounds'.format(episode_num)])
+        if exp_data is None:
             print(
                 'The requested experiment data for the random state action selection experiment does not exist.')
+            return {}
         return exp_data
 
+    def get_experiment_cell_points(self, episode_num, cell_x, cell_y, grid_size=64, encoding=None):
+        """A method to return the samples of a random states experiment within a single cell of
+        the aggregation grid, see get_experiment_random_states_tensors.
+        Params:
+            episode_num: int
+                The episode in which the random states experiment was held.
+            cell_x: int
+                The cell along the first reduced dimension.
+            cell_y: int
+                The cell along the second reduced dimension.
+            grid_size: int
+                The number of cells per dimension of the aggregation grid.
+            encoding: string
+                None for row wise values or one of ARRAY_ENCODINGS for columnar values
+        Returns:
+            cell_data: dict
+                A dict of the form {"indices": list, "values": list} with the sample indices
+                (see get_confidence_frame) and values (see get_experiment_random_states_tensors)
+                of the samples in the cell, or columns instead of values with an encoding.
+        """
+        grid = self._get_experiment_grid(episode_num, grid_size)
+        if grid is None:
+            print('The requested experiment data for the random state action selection experiment does not exist.')
+            return {}
+        cell = np.searchsorted(grid['cells'], cell_x * grid_size + cell_y)
+        indices = np.zeros(0, dtype=np.int64)
+        if cell < len(grid['cells']) and grid['cells'][cell] == cell_x * grid_size + cell_y:
+            indices = grid['order'][grid['starts'][cell]:grid['starts'][cell + 1]]
+        data_values = self._get_experiment_values(episode_num)[indices]
+        cell_data = {'indices': indices.tolist()}
+        if encoding is None:
+            cell_data['values'] = data_values.tolist()
+        else:
+            cell_data['columns'] = [self._encode_array(column, encoding)
+                                    for column in data_values.T]
+        return cell_data
+
     def get_confidence_frames(self, episode_num, index):
         confidence_frames = {'confidenceFrames': []}
-        try:
-            starttime = timeit.default_timer()
-            images = self.provider.read_blob_sequences(
-                self.ctx, plugin_name=meta_image.PLUGIN_NAME, experiment_id="unused",
-                downsample=self.inf)['.']
-            print("Time for loading conf image:",
-                  (timeit.default_timer() - starttime), "s")
-            starttime = timeit.default_timer()
-            for index, tuple_vals in enumerate(images['random-state-ep-{}'.format(episode_num)][index].values):
-                if index == 2:
-                    frame_raw = self.provider.read_blob(
-                        self.ctx, blob_key=tuple_vals.blob_key)
-                    frame_raw = base64.b64encode(frame_raw).decode('ascii')
-                    confidence_frames['confidenceFrames'].append(frame_raw)
-            print("Time for routine:", (timeit.default_timer() - starttime), "s")
-        except KeyError:
-            print("The requested frames do not exist.")
+        frame_raw = self.get_confidence_frame(episode_num, index)
+        if frame_raw is not None:
+            confidence_frames['confidenceFrames'].append(
+                base64.b64encode(frame_raw).decode('ascii'))
         return confidence_frames
 
-    def get_action_distributions(self):
-        """A method to return the action distributions for all episodes.
+    def get_confidence_frame(self, episode_num, index):
+        """A method to get the image of a single random state sample as raw png data.
+        Params:
+            episode_num: int
+                The episode in which the random states experiment was held.
+            index: int
+                The index of the sample within the experiment.
+        Returns:
+            frame_raw: bytes
+                The png encoded state image or None if it does not exist.
+        """
+        blob_keys = self._get_confidence_index().get(episode_num, [])
+        if not 0 <= index < len(blob_keys):
+            print("The requested frames do not exist.")
+            return None
+        return self.backend.read_blob(blob_keys[index])
+
+    def get_confidence_thumbnail(self, episode_num, index, size):
+        """A method to get a downscaled image of a single random state sample as raw png data.
+        Thumbnails are rendered on their first request and cached on disk.
+        Params:
+            episode_num: int
+                The episode in which the random states experiment was held.
+            index: int
+                The index of the sample within the experiment.
+            size: int
+                The maximum edge length of the thumbnail, one of THUMBNAIL_SIZES.
+        Returns:
+            thumbnail: bytes
+                The png encoded thumbnail or None if the sample does not exist.
+        """
+        thumbnail = self._get_confidence_thumbnails(episode_num, [index], size).get(index)
+        if thumbnail is None:
+            print("The requested frames do not exist.")
+        return thumbnail
+
+    def get_confidence_frames_batch(self, episode_num, indices, size=None):
+        """A method to get the images of many random state samples of an experiment at once,
+        e.g. for all visible points of the experiment's scatter plot.
+        Params:
+            episode_num: int
+                The episode in which the random states experiment was held.
+            indices: list
+                The indices of the samples within the experiment.
+            size: int
+                One of THUMBNAIL_SIZES to return thumbnails (see get_confidence_thumbnail),
+                None for the full size images.
+        Returns:
+            confidence_frames: dict
+                A dict of the form {"confidenceFrames": {index: base64 png}}, samples which do
+                not exist are left out.
+        """
+        if size is None:
+            blob_keys = self._get_confidence_index().get(episode_num, [])
+            frames_raw = {index: self.backend.read_blob(blob_keys[index])
+                          for index in indices if 0 <= index < len(blob_keys)}
+        else:
+            frames_raw = self._get_confidence_thumbnails(episode_num, indices, size)
+        frames = {index: base64.b64encode(frame_raw).decode('ascii')
+                  for index, frame_raw in frames_raw.items()}
+        if len(frames) < len(indices):
+            print("Some of the requested frames do not exist.")
+        return {'confidenceFrames': frames}
+
+    def get_action_distributions(self, from_episode=None, to_episode=None, window=None,
+                                 aggregate='sum', columnar=False, rolling=None, cumulative=False):
+        """A method to return the action distributions for a range of episodes.
+        Params:
+            from_episode: int
+                The first episode (inclusive), None for the first logged episode.
+            to_episode: int
+                The last episode (inclusive), None for the last logged episode.
+            window: int
+                The number of episodes aggregated into one, None for every single episode.
+                Windows are aligned to multiples of window and named by their first episode.
+            aggregate: string
+                How the counts of the episodes of a window (or of a rolling window) are
+                aggregated, one of DISTRIBUTION_AGGREGATES.
+            columnar: bool
+                Whether to return the counts as one [episodes, actions] matrix.
+            rolling: int
+                Return the counts of the last rolling episodes up to every returned episode
+                (or up to the end of every window) instead, e.g. the action frequencies over the
+                last 100 episodes.
+            cumulative: bool
+                Return the counts of all episodes up to every returned episode (or up to the end
+                of every window) instead.
 
         Returns:
             action_distributions: dict
                 A dictionary containing actions and their corresponding count in an episode
-                action_distribution[episode]=[{name: action_name, value: action_count},...]"""
-        action_distributions = {}
-        try:
-            action_distrib_tensors = self.provider.read_tensors(
-                experiment_id="unused", ctx=self.ctx, plugin_name='action_distributions', downsample=self.inf)['.']['action_distributions']
-            for act_dist_tensor in action_distrib_tensors:
-                action_counts = np.array(act_dist_tensor.numpy)
-                action_distributions[act_dist_tensor.step] = [{"name": "action{}".format(
-                    count[0]), "value": float(count[1])} for count in action_counts]
-        except KeyError:
+                action_distribution[episode]=[{name: action_name, value: action_count},...]
+                Columnar, the dict is of the form {"episodes": list, "names": list,
+                "counts": [[count per action] per episode]}."""
+        action_distributions = self._query_distribution(
+            'action_distributions', "action{}", from_episode, to_episode, window, aggregate, columnar,
+            rolling, cumulative, float_counts=True)
+        if action_distributions is None:
             print('Key error Action Distributions exception')
-
+            return {}
         return action_distributions
 
-    def get_custom_distributions(self, distribution_name):
-        """A method to return custom distributions for all episodes. e.g. for rewards
+    def get_custom_distributions(self, distribution_name, from_episode=None, to_episode=None,
+                                 window=None, aggregate='sum', columnar=False, rolling=None,
+                                 cumulative=False):
+        """A method to return custom distributions for a range of episodes. e.g. for rewards
+        Params:
+            distribution_name: string
+                The tag of the distribution.
+            from_episode, to_episode, window, aggregate, columnar, rolling, cumulative:
+                See get_action_distributions.
 
         Returns:
             action_distributions: dict
                 A dictionary containing actions and their corresponding count in an episode
-                action_distribution[episode]=[{name: action_name, value: action_count},...]"""
-        custom_distributions = {}
-        try:
-            distrib_tensors = self.provider.read_tensors(
-                experiment_id="unused", ctx=self.ctx, plugin_name=distribution_name, downsample=self.inf)['.'][distribution_name]
-            for dist_tensor in distrib_tensors:
-
-                counts = np.array(dist_tensor.numpy)
-                custom_distributions[dist_tensor.step] = [{"name": "{}".format(
-                    count[0]), "value": count[1]} for count in counts]
-        except KeyError:
+                action_distribution[episode]=[{name: action_name, value: action_count},...]
+                Columnar, the dict is of the form {"episodes": list, "names": list,
+                "counts": [[count per value] per episode]}."""
+        custom_distributions = self._query_distribution(
+            distribution_name, "{}", from_episode, to_episode, window, aggregate, columnar,
+            rolling, cumulative)
+        if custom_distributions is None:
             print('Key error Action Distributions exception')
+            return {}
         return custom_distributions
 
     def get_distribution_tags(self):
@@ -343,8 +787,7 @@ class DataPreprocessor:
             logTags: dict
                 A dict containing a list of valid log tags for distributions
         """
-        plugin_names = list(self.provider.list_plugins(
-            experiment_id="unused", ctx=self.ctx))
+        plugin_names = self.tag_index['plugins']
         distrib_tags = []
         DEFAULT_PLUGINS = [
             'scalars',
@@ -363,35 +806,70 @@ class DataPreprocessor:
 
         return {"logTags": distrib_tags}
 
-    def get_weights_for_episode(self, episode_num):
+    def get_weights_for_episode(self, episode_num, encoding=None, timestep=None):
         """"A method to return the logged weight matrix for each timestep in an episode.
         Params:
             episode_num: int
                 The episode one wants to return the weight matrices for.
+            encoding: string
+                None for a dict of {"i,j": weight} entries per timestep or one of ARRAY_ENCODINGS
+                for a single base64 encoded little endian buffer, which can be read directly
+                into a typed array.
+            timestep: int
+                The index of a single timestep to return, None returns all timesteps.
         Returns:
             weights_episode: dict
                 A dict containing the weight matrices for 0..n timesteps for episode episode_num.
                 Even though most algorithms don't update their weights every timestep in an episode,
                 this was done for a more general applicability.
+                With an encoding the dict is of the form {"steps": list, "weights": encoded_array},
+                where the encoded array has the shape [timesteps, rows, cols] (see _encode_array).
         """
-        weights_episode = {}
-        try:
-            tensordata = self.provider.read_tensors(experiment_id="unused", ctx=self.ctx, plugin_name='weights', downsample=self.inf)[
-                '.']['weights-episode-{}'.format(episode_num)]
-            for h_index, tensordatum in enumerate(tensordata):
-                weights = tensordatum.numpy
-                weight_data = []
-                for i, weight_pair in enumerate(weights):
-                    for j, weight in enumerate(weight_pair):
-
-                        index = str(i)+"," + str(j)
-                        weight_data.append({index: float(weight)})
-                weights_episode[h_index] = weight_data
-
-        except KeyError:
+        steps, weights = self._get_weight_tensor(episode_num)
+        if weights is None:
             print('Key error Weights Exception')
+            return {}
+        indices = np.arange(len(steps))
+        if timestep is not None:
+            indices = indices[timestep:timestep + 1] if timestep >= 0 else indices[:0]
+
+        if encoding is not None:
+            return {'steps': steps[indices].tolist(),
+                    'weights': self._encode_array(weights[indices], encoding)}
+
+        entry_keys = ["{},{}".format(i, j) for i in range(weights.shape[1])
+                      for j in range(weights.shape[2])]
+        weights_episode = {}
+        for h_index in indices.tolist():
+            weights_episode[h_index] = [{key: weight} for key, weight in zip(
+                entry_keys, weights[h_index].ravel().tolist())]
         return weights_episode
 
+    def get_weight_summaries(self, episode_num, top_k=10):
+        """A method to return a summary of how the weights develop over the timesteps of an
+        episode, which is far smaller than the weight matrices themselves.
+        Params:
+            episode_num: int
+                The episode one wants to return the summary for.
+            top_k: int
+                The number of most changed weights returned per timestep.
+        Returns:
+            weight_summaries: dict
+                A dict of the form {"steps": list, "shape": [rows, cols], "norm": list,
+                "rowNorms": list, "change": list, "topChanges": list}. norm is the frobenius
+                norm per timestep, rowNorms the L2 norm of every row per timestep and change the
+                L2 norm of the difference to the previous timestep (0 for the first timestep).
+                topChanges contains per timestep the [[row, col, delta], ...] of the top_k
+                weights with the largest absolute change since the previous timestep.
+        """
+        summary = self._cached(('weight_summaries', episode_num, top_k),
+                               lambda: self._summarize_weights(episode_num, top_k),
+                               ['weights-episode-{}'.format(episode_num)])
+        if summary is None:
+            print('Key error Weights Exception')
+            return {}
+        return summary
+
     def get_action_meanings(self):
         """A method to return corresponding meanings for given actions
         Returns:
@@ -399,26 +877,1266 @@ class DataPreprocessor:
                 A dict of the form {action_meanings: [action_0_meaning, ...., action_n_meaning]}
         """
         action_meanings = {}
-        try:
-            tensordata = self.provider.read_tensors(experiment_id="unused", ctx=self.ctx,
-                                                    plugin_name='action_meanings', downsample=self.inf)[
-                '.']['action_meanings_']
-            action_meanings['action_meanings'] = tensordata[0].numpy.tolist()
-            action_meanings['action_meanings'] = [
-                elem.decode('utf-8') for elem in action_meanings['action_meanings']]
-
-        except KeyError:
+        _, tensordata = self._read_tensors('action_meanings', 'action_meanings_')
+        if not len(tensordata):
             print("The requested data for meanings of given actions does not exist")
+        else:
+            action_meanings['action_meanings'] = [
+                elem.decode('utf-8') for elem in np.asarray(tensordata[0]).tolist()]
 
         return action_meanings
 
-    def _create_multiplexer(self):
-        """A method to create a multiplexer for the data provider
+    def _create_backend(self):
+        """A method to create the backend through which the data of the run is read.
+
+        Returns:
+        backend: DataBackend
+            The backend of the name backend_name, see BACKENDS.
+        """
+        return BACKENDS[self.backend_name](self.log_dir, self.load_workers, self.memory_budget)
+
+    def _get_scalar_series(self, tag):
+        """A method to return the scalar values of a tag as numpy arrays. The arrays are
+        cached and only extended by the newly logged values after a reload.
+        Params:
+            tag: string
+            The tag of the scalar values.
+        Returns:
+            series: dict
+                A dict of the form {"version": list, "steps": np.ndarray, "values": np.ndarray,
+                "trends": dict} or None if the tag does not exist.
+        """
+        with self._get_lock(('scalars', tag)):
+            series = self._scalar_series.get(tag)
+            # taken before reading, so values read during a reload are read again afterwards
+            version = self._get_version([tag])
+            if series is not None and series['version'] == version:
+                return series
+
+            steps, values = self.backend.read_scalars(tag)
+            if not len(steps):
+                print("Scalar queried with the tag "+str(tag) + " does not exist.")
+                return None
+            if np.any(steps[1:] <= steps[:-1]):
+                # steps logged twice (e.g. restarted training in the same logdir) have their
+                # last value, so all endpoints agree and the steps are sorted
+                last_indices = len(steps) - 1 - np.unique(steps[::-1], return_index=True)[1]
+                steps, values = steps[last_indices], values[last_indices]
+            num_cached = 0 if series is None else len(series['steps'])
+            if num_cached > len(steps) or (num_cached and not (
+                    np.array_equal(steps[:num_cached], series['steps'])
+                    and np.array_equal(values[:num_cached], series['values'], equal_nan=True))):
+                # the logged data was replaced (e.g. restarted training), start over
+                series = None
+            # a new dict, so concurrent requests still holding the old series see consistent
+            # values, the trends and the pyramid are only extended by the values after the old ones
+            series = {'trends': {}} if series is None else dict(series, trends=dict(series['trends']))
+            series['steps'] = steps
+            series['values'] = values
+            series['version'] = version
+            self._scalar_series[tag] = series
+            return series
+
+    def _build_pyramids(self):
+        """A method to build or extend the scalar pyramids of all episode level scalars and of
+        all other scalars, whose pyramid was already requested."""
+        episode_tags = set(self.tag_index['episodeTags'])
+        for tag in self.tag_index['scalars']:
+            if tag in episode_tags or 'pyramid' in self._scalar_series.get(tag, {}):
+                self._get_pyramid(tag)
+
+    def _build_tag_index(self):
+        """A method to (re)build the tag index, see get_tag_index."""
+        scalars = self.backend.list_tags(meta_scalar.PLUGIN_NAME)
+        frame_tags = self.backend.list_tags(meta_image.PLUGIN_NAME)
+
+        episode_tags = []
+        timestep_tags = {}
+        # sorted, as the order of the listed tags differs between backends
+        for tag, time_series in sorted(scalars.items()):
+            match = self.TIMESTEP_TAG_PATTERN.match(tag)
+            if match is None:
+                episode_tags.append(tag)
+            else:
+                timestep_tags.setdefault(match.group(1), []).append(
+                    (int(match.group(2)), time_series['maxStep']))
+        for metric, episodes in timestep_tags.items():
+            episodes.sort()
+            timestep_tags[metric] = {'episodes': [episode for episode, _ in episodes],
+                                     'maxSteps': [max_step for _, max_step in episodes]}
+        frame_episodes = sorted(int(match.group(1)) for match in map(
+            self.FRAME_TAG_PATTERN.match, frame_tags) if match is not None)
+
+        plugins = self.backend.list_plugins()
+        self.tag_index = {'scalars': scalars,
+                          'episodeTags': episode_tags,
+                          'timestepTags': timestep_tags,
+                          'frameEpisodes': frame_episodes,
+                          'plugins': plugins}
+
+        # tag -> [(plugin, maxStep, wallTime)], which changes whenever data is logged under the tag
+        tag_versions = {}
+        for plugin in sorted(plugins):
+            plugin_tags = {meta_scalar.PLUGIN_NAME: scalars, meta_image.PLUGIN_NAME: frame_tags}.get(
+                plugin) or self.backend.list_tags(plugin)
+            for tag, time_series in plugin_tags.items():
+                tag_versions.setdefault(tag, []).append(
+                    (plugin, time_series['maxStep'], time_series['wallTime']))
+        if tag_versions != self._tag_versions:
+            self.content_version += 1
+        self._tag_versions = tag_versions
+
+    def _get_episode_mask(self, table, predicates, from_episode, to_episode):
+        """A method to evaluate predicates on the episode table as one boolean mask.
+        Params:
+            table: dict
+                The episode table, which is replaced by reloads.
+            predicates, from_episode, to_episode:
+                See query_episodes.
+        Returns:
+            mask: np.ndarray
+                The mask of the matching rows of the episode table.
+        """
+        episodes = table['episode']
+        mask = np.ones(len(episodes), dtype=bool)
+        if from_episode is not None:
+            mask &= episodes >= from_episode
+        if to_episode is not None:
+            mask &= episodes <= to_episode
+        for predicate in predicates or []:
+            match = self.EPISODE_PREDICATE_PATTERN.match(predicate)
+            if match is None:
+                raise ValueError("Invalid predicate " + predicate)
+            column, operator, value = match.groups()
+            if column not in table:
+                raise ValueError("Unknown episode table column " + column)
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError("Invalid number in predicate " + predicate)
+            # comparisons with missing (nan) values are false, except for !=
+            mask &= self.EPISODE_PREDICATE_OPERATORS[operator](table[column], value) & \
+                ~np.isnan(table[column].astype(np.float64))
+        return mask
+
+    def _build_episode_table(self):
+        """A method to (re)build the episode table, see get_episode_table. The episode level
+        scalars and the action distributions are cached anyway, from the timestep level metrics
+        only the tags of new or grown episodes are read again."""
+        sources = {}
+        for tag in self.tag_index['episodeTags']:
+            series = self._get_scalar_series(tag)
+            if series is not None:
+                # an episode logged twice (e.g. restarted training) has its last value
+                last_indices = len(series['steps']) - 1 - np.unique(
+                    series['steps'][::-1], return_index=True)[1]
+                sources[self.EPISODE_TABLE_TAGS.get(tag, tag)] = (
+                    series['steps'][last_indices], series['values'][last_indices])
+
+        lengths = {}
+        for metric, metric_episodes in self.tag_index['timestepTags'].items():
+            metric_table = self._get_episode_metric(metric, metric_episodes)
+            sources[metric + 'Mean'] = (metric_table['episodes'], metric_table['means'])
+            lengths[metric] = (metric_table['episodes'], metric_table['lengths'])
+
+        distribution = self._get_distribution_matrix('action_distributions')
+        if distribution is not None:
+            counts = distribution['counts'].astype(np.float64)
+            totals = counts.sum(axis=1, keepdims=True)
+            probs = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+            log_probs = np.log(probs, out=np.zeros_like(probs), where=probs > 0)
+            sources['actionEntropy'] = (distribution['episodes'], -np.sum(probs * log_probs, axis=1))
+
+        episodes = np.unique(np.concatenate(
+            [np.asarray(self.tag_index['frameEpisodes'], dtype=np.int64)] +
+            [source_episodes for source_episodes, _ in list(sources.values()) + list(lengths.values())]))
+        table = {'episode': episodes, 'length': np.zeros(len(episodes), dtype=np.int64)}
+        for metric_episodes, metric_lengths in lengths.values():
+            positions = np.searchsorted(episodes, metric_episodes)
+            table['length'][positions] = np.maximum(table['length'][positions], metric_lengths)
+        table['totalSteps'] = np.cumsum(table['length'])
+        for column in ['return', 'divergence', 'actionEntropy'] + sorted(sources):
+            if column in sources and column not in table:
+                source_episodes, source_values = sources[column]
+                table[column] = np.full(len(episodes), np.nan)
+                table[column][np.searchsorted(episodes, source_episodes)] = source_values
+        self.episode_table = table
+
+    def _get_episode_metric(self, metric, metric_episodes):
+        """A method to return the mean and the number of values per episode of a timestep
+        level metric. Only the episodes, whose last step changed since the last call, are read.
+        Params:
+            metric: string
+                The metric of the tags {metric}-e{episode}.
+            metric_episodes: dict
+                The sorted "episodes" and their "maxSteps" from the tag index.
+        Returns:
+            metric_table: dict
+                A dict of the form {"episodes": np.ndarray, "maxSteps": np.ndarray,
+                "means": np.ndarray, "lengths": np.ndarray}.
+        """
+        episodes = np.asarray(metric_episodes['episodes'], dtype=np.int64)
+        max_steps = np.asarray(metric_episodes['maxSteps'], dtype=np.int64)
+        means = np.full(len(episodes), np.nan)
+        lengths = np.zeros(len(episodes), dtype=np.int64)
+        stale = np.ones(len(episodes), dtype=bool)
+        old_table = self._episode_metrics.get(metric)
+        if old_table is not None and len(old_table['episodes']) and len(episodes):
+            positions = np.minimum(np.searchsorted(old_table['episodes'], episodes),
+                                   len(old_table['episodes']) - 1)
+            known = (old_table['episodes'][positions] == episodes) & \
+                (old_table['maxSteps'][positions] == max_steps)
+            means[known] = old_table['means'][positions[known]]
+            lengths[known] = old_table['lengths'][positions[known]]
+            stale = ~known
+        for index in np.flatnonzero(stale).tolist():
+            _, values = self.backend.read_scalars('{}-e{}'.format(metric, episodes[index]))
+            lengths[index] = len(values)
+            if len(values):
+                means[index] = values.mean()
+        metric_table = {'episodes': episodes, 'maxSteps': max_steps, 'means': means, 'lengths': lengths}
+        self._episode_metrics[metric] = metric_table
+        return metric_table
+
+    def _get_pyramid(self, tag):
+        """A method to return the pyramid of (min, max, sum, count) buckets of a scalar series.
+        Level k of the pyramid aggregates 2^k consecutive values per bucket. After a reload only
+        the buckets containing new values are computed.
+        Params:
+            tag: string
+                The tag of the scalar values.
+        Returns:
+            pyramid: list
+                A list of levels, each a dict of numpy arrays with the keys min, max, sum
+                and count, or None if the tag does not exist.
+        """
+        with self._get_lock(('scalars', tag)):
+            return self._build_pyramid(self._get_scalar_series(tag))
+
+    def _build_pyramid(self, series):
+        """A method to build or extend the pyramid of a scalar series, see _get_pyramid."""
+        if series is None:
+            return None
+        values = series['values']
+        if series.get('pyramid_size') == len(values):
+            return series['pyramid']
+
+        num_built = series.get('pyramid_size', 0)
+        old_pyramid = series.get('pyramid', [])
+        pyramid = [{'min': values, 'max': values, 'sum': values,
+                    'count': np.ones(len(values), dtype=np.int64)}]
+        while len(pyramid[-1]['count']) > 1:
+            level_num = len(pyramid)
+            lower = pyramid[-1]
+            # buckets covering only values of the last build did not change
+            num_kept = num_built >> level_num if level_num < len(old_pyramid) else 0
+            pairs = np.arange(2 * num_kept, len(lower['count']), 2)
+            old_level = old_pyramid[level_num] if num_kept else None
+            level = {}
+            for key, reduce in (('min', np.minimum), ('max', np.maximum),
+                                ('sum', np.add), ('count', np.add)):
+                new_buckets = reduce.reduceat(lower[key], pairs)
+                level[key] = new_buckets if old_level is None else \
+                    np.concatenate([old_level[key][:num_kept], new_buckets])
+            pyramid.append(level)
+
+        series['pyramid'] = pyramid
+        series['pyramid_size'] = len(values)
+        return pyramid
+
+    def _get_trend(self, series, smoother, smoothing=None):
+        """A method to return the (cached) trend of a scalar series. Trends of the ema and rolling
+        smoothers are only computed for values which were added since the last computation.
+        The polynomial fit depends on all values and is refitted whenever the series grew.
+        Params:
+            series: dict
+                A series as returned by _get_scalar_series.
+            smoother: string
+                One of SMOOTHERS.
+            smoothing: number
+                The parameter of the smoother, see get_scalar_values_by_tag.
+        Returns:
+            trend: np.ndarray
+                The trend value per scalar value.
+        Raises:
+            ValueError: for a smoothing out of the range of the smoother
+        """
+        values = series['values']
+        if smoothing is None:
+            smoothing = self.SMOOTHERS[smoother]
+        elif smoother == 'ema' and not 0 < smoothing <= 1:
+            raise ValueError("The smoothing of ema has to be between 0 (exclusive) and 1")
+        elif smoother != 'ema' and (not float(smoothing).is_integer() or not 1 <= smoothing <= len(values)):
+            # every distinct smoothing is cached, so the window size is bounded by the values
+            raise ValueError("The smoothing of {} has to be an integer between 1 and {}".format(
+                smoother, len(values)))
+        cached_trend = series['trends'].get((smoother, smoothing), np.empty(0))
+        start = len(cached_trend)
+        if start == len(values):
+            return cached_trend
+
+        if smoother == 'polyfit':
+            degree = min(int(smoothing), len(values) - 1)
+            indices = np.arange(len(values))
+            trend = np.polyval(np.polyfit(indices, values, degree), indices)
+        elif smoother == 'ema':
+            # y[i] = alpha * x[i] + (1 - alpha) * y[i-1], continued from the last cached value
+            last = cached_trend[-1] if start else values[0]
+            tail, _ = lfilter([smoothing], [1, smoothing - 1], values[start:],
+                              zi=[(1 - smoothing) * last])
+            trend = np.concatenate([cached_trend, tail])
+        else:
+            # trailing windows, the first values are averaged over all values so far
+            window = int(smoothing)
+            padded = np.concatenate([np.full(window - 1, np.nan), values])
+            windows = sliding_window_view(padded[start:], window)
+            if smoother == 'rolling_mean':
+                tail = np.nanmean(windows, axis=1)
+            else:
+                tail = np.nanmedian(windows, axis=1)
+            trend = np.concatenate([cached_trend, tail])
+
+        series['trends'][(smoother, smoothing)] = trend
+        return trend
+
+    @staticmethod
+    def _lttb_indices(steps, values, max_points):
+        """A method to downsample a series with the largest triangle three buckets algorithm.
+        The first and the last value are always kept, every bucket in between contributes the
+        value spanning the largest triangle with the previously selected value and the mean of
+        the next bucket.
+        Params:
+            steps: np.ndarray
+                The steps (x values) of the series.
+            values: np.ndarray
+                The values (y values) of the series.
+            max_points: int
+                The number of values to keep.
+        Returns:
+            indices: np.ndarray
+                The sorted indices of the kept values.
+        """
+        num_values = len(values)
+        if max_points < 3:
+            return np.arange(num_values)[:max_points]
+        steps = steps.astype(np.float64)
+        # buckets over all values except the first and the last one
+        edges = np.linspace(1, num_values - 1, max_points - 1).astype(np.int64)
+        step_sums = np.concatenate([[0], np.cumsum(steps)])
+        value_sums = np.concatenate([[0], np.cumsum(values)])
+        # mean point of the following bucket, the last value follows the last bucket
+        next_starts = np.append(edges[1:-1], num_values - 1)
+        next_ends = np.append(edges[2:], num_values)
+        next_counts = next_ends - next_starts
+        next_steps = (step_sums[next_ends] - step_sums[next_starts]) / next_counts
+        next_values = (value_sums[next_ends] - value_sums[next_starts]) / next_counts
+
+        indices = np.empty(max_points, dtype=np.int64)
+        indices[0] = 0
+        indices[-1] = num_values - 1
+        selected = 0
+        for bucket in range(max_points - 2):
+            start, end = edges[bucket], edges[bucket + 1]
+            areas = np.abs((steps[selected] - next_steps[bucket]) * (values[start:end] - values[selected])
+                           - (steps[selected] - steps[start:end]) * (next_values[bucket] - values[selected]))
+            selected = start + int(np.argmax(areas))
+            indices[bucket + 1] = selected
+        return indices
+
+    @staticmethod
+    def _min_max_indices(values, max_points):
+        """A method to downsample a series by keeping the minimum and maximum value of
+        max_points / 2 equally sized buckets.
+        Params:
+            values: np.ndarray
+                The values of the series.
+            max_points: int
+                The number of values to keep.
+        Returns:
+            indices: np.ndarray
+                The sorted indices of the kept values.
+        """
+        num_buckets = max(1, max_points // 2)
+        buckets = np.arange(len(values)) * num_buckets // len(values)
+        # sorted by bucket, then by value: first and last entry per bucket are min and max
+        order = np.lexsort((values, buckets))
+        bucket_starts = np.searchsorted(buckets[order], np.arange(num_buckets))
+        bucket_ends = np.append(bucket_starts[1:], len(values)) - 1
+        return np.unique(np.concatenate([order[bucket_starts], order[bucket_ends]]))
+
+    def _get_distribution_matrix(self, distribution_name):
+        """A method to return the counts of a distribution as a dense matrix. The matrix is
+        extended by the newly logged episodes after a reload instead of being rebuilt.
+        Params:
+            distribution_name: string
+                The tag of the distribution.
+        Returns:
+            matrix: dict
+                A dict of the form {"episodes": np.ndarray, "values": np.ndarray,
+                "counts": np.ndarray, "numTensors": int, "lastStep": int} with the sorted episodes,
+                the sorted distinct values and the [episodes, values] counts, None if the
+                distribution was not logged. numTensors and lastStep describe the tensors read.
+                The matrix might also contain the prefix sums, see _get_distribution_prefix.
+        """
+        key = ('distributions', distribution_name)
+        with self._get_lock(key):
+            return self._update_distribution_matrix(key, distribution_name)
+
+    def _update_distribution_matrix(self, key, distribution_name):
+        """A method to extend the distribution matrix by the newly logged episodes, see
+        _get_distribution_matrix."""
+        version, matrix = self._cache.get(key, (None, None))
+        current_version = self._get_version([distribution_name])
+        if version == current_version:
+            self.memory_budget.touch(self, key)
+            return matrix
+
+        steps, tensors = self._read_tensors(distribution_name, distribution_name)
+        if not len(steps):
+            return None
+        num_read = 0 if matrix is None else matrix['numTensors']
+        if num_read > len(steps) or (num_read and steps[num_read - 1] != matrix['lastStep']):
+            # the logged data was replaced (e.g. restarted training), start over
+            num_read = 0
+            matrix = None
+        new_steps = steps[num_read:]
+        if matrix is not None and not len(new_steps):
+            self._cache[key] = (current_version, matrix)
+            return matrix
+        # an episode logged twice is counted with its last distribution
+        last_indices = len(new_steps) - 1 - np.unique(new_steps[::-1], return_index=True)[1]
+        new_tensors = [np.asarray(tensors[num_read + index]).reshape(-1, 2) for index in last_indices]
+        new_steps = new_steps[last_indices]
+
+        if matrix is None:
+            dtype = np.result_type(*new_tensors)
+            matrix = {'episodes': np.empty(0, dtype=np.int64), 'values': np.empty(0, dtype=dtype),
+                      'counts': np.empty((0, 0), dtype=dtype)}
+        pairs = np.concatenate(new_tensors)
+        episodes = np.union1d(matrix['episodes'], new_steps)
+        values = np.union1d(matrix['values'], pairs[:, 0])
+        counts = matrix['counts']
+        prefix = None
+        if len(values) == len(matrix['values']) and np.result_type(counts, pairs) == counts.dtype \
+                and (not len(matrix['episodes']) or new_steps.min() > matrix['episodes'][-1]):
+            # the common case of new episodes without new values, rows are appended
+            counts = np.concatenate([counts, np.zeros((len(new_steps), len(values)), dtype=counts.dtype)])
+            # the prefix sums of the old rows stay valid and are extended on their next use
+            prefix = matrix.get('prefix')
+        else:
+            counts = np.zeros((len(episodes), len(values)), dtype=np.result_type(counts, pairs))
+            counts[np.ix_(np.searchsorted(episodes, matrix['episodes']),
+                          np.searchsorted(values, matrix['values']))] = matrix['counts']
+
+        rows = np.searchsorted(episodes, new_steps)
+        counts[rows] = 0
+        tensor_rows = np.repeat(rows, [len(tensor) for tensor in new_tensors])
+        counts[tensor_rows, np.searchsorted(values, pairs[:, 0])] = pairs[:, 1]
+
+        matrix = {'episodes': episodes, 'values': values, 'counts': counts,
+                  'numTensors': len(steps), 'lastStep': steps[-1]}
+        if prefix is not None:
+            matrix['prefix'] = prefix
+        self._cache[key] = (current_version, matrix)
+        self.memory_budget.add(self, key, _estimate_nbytes(matrix), key[0])
+        return matrix
+
+    def _get_distribution_prefix(self, distribution_name, matrix):
+        """A method to return the prefix sums of the counts of a distribution matrix, with which
+        the summed counts of any range of episodes are computed in O(values).
+        Params:
+            distribution_name: string
+                The tag of the distribution.
+            matrix: dict
+                The matrix, see _get_distribution_matrix.
+        Returns:
+            prefix: np.ndarray
+                The [episodes + 1, values] prefix sums, prefix[j] - prefix[i] are the counts
+                summed over the rows i to j - 1.
+        """
+        with self._get_lock(('distributions', distribution_name)):
+            counts = matrix['counts']
+            prefix = matrix.get('prefix')
+            if prefix is None:
+                prefix = np.zeros((1, counts.shape[1]), dtype=counts.dtype)
+            if len(prefix) <= len(counts):
+                # only the rows appended since the last use are added
+                prefix = np.concatenate([prefix, prefix[-1] + np.cumsum(counts[len(prefix) - 1:], axis=0)])
+                matrix['prefix'] = prefix
+                self.memory_budget.add(self, ('distributions', distribution_name),
+                                       _estimate_nbytes(matrix), 'distributions')
+            return prefix
+
+    def _query_distribution(self, distribution_name, name_format, from_episode, to_episode,
+                            window, aggregate, columnar, rolling=None, cumulative=False,
+                            float_counts=False):
+        """A method to select and aggregate the episodes of a distribution, see
+        get_action_distributions. Every returned row sums the counts of a range of rows of the
+        distribution matrix, which is the difference of two prefix sums.
+        Params:
+            distribution_name: string
+                The tag of the distribution.
+            name_format: string
+                The format of the name of a value.
+            float_counts: bool
+                Whether counts are returned as floats.
+        Returns:
+            distribution: dict
+                The distribution per (window of) episode(s), None if it was not logged.
+        """
+        matrix = self._get_distribution_matrix(distribution_name)
+        if matrix is None:
+            return None
+        all_episodes = matrix['episodes']
+        start = 0 if from_episode is None else np.searchsorted(all_episodes, from_episode, 'left')
+        end = len(all_episodes) if to_episode is None else np.searchsorted(all_episodes, to_episode, 'right')
+        episodes = all_episodes[start:end]
 
-        Retuns:
-            multiplexer: EventMultiplexer
-                The event multiplexer for loading data from a tf.summary written file
+        # the returned rows sum the matrix rows range_starts[i] to range_ends[i] - 1
+        range_ends = np.arange(start + 1, end + 1)
+        if window is not None and len(episodes):
+            windows = episodes // window
+            window_starts = np.flatnonzero(np.diff(windows, prepend=windows[0] - 1))
+            range_ends = start + np.append(window_starts[1:], len(episodes))
+            range_starts = start + window_starts
+            episodes = windows[window_starts] * window
+        else:
+            range_starts = range_ends - 1
+        if cumulative:
+            range_starts = np.zeros_like(range_ends)
+        elif rolling is not None:
+            range_starts = np.searchsorted(all_episodes, all_episodes[range_ends - 1] - rolling, 'right')
+
+        if window is None and not cumulative and rolling is None:
+            counts = matrix['counts'][start:end]
+        else:
+            prefix = self._get_distribution_prefix(distribution_name, matrix)
+            counts = prefix[range_ends] - prefix[range_starts]
+            if aggregate == 'mean':
+                counts = counts / np.maximum(range_ends - range_starts, 1)[:, None]
+        if float_counts:
+            counts = counts.astype(np.float64)
+
+        # values which do not occur in the selected episodes are left out
+        occurring = counts.any(axis=0)
+        names = [name_format.format(value) for value in matrix['values'][occurring].tolist()]
+        counts = counts[:, occurring]
+        if columnar:
+            return {'episodes': episodes.tolist(), 'names': names, 'counts': counts.tolist()}
+        return {episode: [{"name": name, "value": count}
+                          for name, count in zip(names, episode_counts) if count]
+                for episode, episode_counts in zip(episodes.tolist(), counts.tolist())}
+
+    def _get_weight_tensor(self, episode_num):
+        """A method to return the weight matrices of all timesteps of an episode stacked into
+        one tensor.
+        Params:
+            episode_num: int
+                The episode of the weight matrices.
+        Returns:
+            steps, weights: (np.ndarray, np.ndarray)
+                The logged step per timestep and the weight tensor of the shape
+                [timesteps, rows, cols], (None, None) if no weights were logged for the episode.
         """
+        def stack_weights():
+            steps, tensordata = self._read_tensors('weights', 'weights-episode-{}'.format(episode_num))
+            if not len(steps):
+                return None, None
+            weights = np.stack([np.asarray(tensordatum, dtype=np.float32).reshape(
+                len(tensordatum), -1) for tensordatum in tensordata])
+            return steps, weights
+        return self._cached(('weights', episode_num), stack_weights, ['weights-episode-{}'.format(episode_num)])
+
+    def _get_probs_tensor(self, episode_num):
+        """A method to return the action probabilities of all timesteps of an episode stacked
+        into one matrix.
+        Params:
+            episode_num: int
+                The episode of the action probabilities.
+        Returns:
+            steps, probs: (np.ndarray, np.ndarray)
+                The logged step per timestep and the probabilities of the shape [timesteps, actions],
+                (None, None) if no probabilities were logged for the episode.
+        """
+        def stack_probs():
+            steps, tensordata = self._read_tensors('action_probs', 'e{}'.format(episode_num))
+            if not len(steps):
+                return None, None
+            probs = np.stack([np.asarray(tensordatum, dtype=np.float64).ravel()
+                              for tensordatum in tensordata])
+            return steps, probs
+        return self._cached(('action_probs', episode_num), stack_probs, ['e{}'.format(episode_num)])
+
+    def _summarize_weights(self, episode_num, top_k):
+        """A method to compute the weight summaries of an episode, see get_weight_summaries.
+        All summaries are computed vectorized over the stacked weight tensor of the episode.
+        """
+        steps, weights = self._get_weight_tensor(episode_num)
+        if weights is None:
+            return None
+        num_timesteps, num_rows, num_cols = weights.shape
+        weights = weights.astype(np.float64)
+        deltas = np.diff(weights, axis=0, prepend=weights[:1])
+
+        row_norms = np.linalg.norm(weights, axis=2)
+        flat_deltas = deltas.reshape(num_timesteps, -1)
+        top_k = min(top_k, flat_deltas.shape[1])
+        top_indices = np.argpartition(-np.abs(flat_deltas), top_k - 1, axis=1)[:, :top_k]
+        top_deltas = np.take_along_axis(flat_deltas, top_indices, axis=1)
+        # sort the top entries of every timestep by descending absolute change
+        order = np.argsort(-np.abs(top_deltas), axis=1)
+        top_indices = np.take_along_axis(top_indices, order, axis=1)
+        top_deltas = np.take_along_axis(top_deltas, order, axis=1)
+        top_changes = np.stack([top_indices // num_cols, top_indices % num_cols, top_deltas], axis=2)
+
+        return {'steps': steps.tolist(),
+                'shape': [num_rows, num_cols],
+                'norm': np.linalg.norm(row_norms, axis=1).tolist(),
+                'rowNorms': row_norms.tolist(),
+                'change': np.linalg.norm(flat_deltas, axis=1).tolist(),
+                'topChanges': [[[int(row), int(col), delta] for row, col, delta in timestep_changes]
+                               for timestep_changes in top_changes.tolist()]}
+
+    def _prepare_experiment_data(self, episode_num, encoding, max_points, grid_size):
+        """A method to prepare the data of a random states experiment, see
+        get_experiment_random_states_tensors."""
+        experiment_ids_numerical = self._get_experiment_episodes()
+        if not experiment_ids_numerical:
+            return None
+        exp_data = {'minEpisode': experiment_ids_numerical[0],
+                    'maxEpisode': experiment_ids_numerical[-1],
+                    'step': experiment_ids_numerical[1] - experiment_ids_numerical[0]
+                    if len(experiment_ids_numerical) >= 2 else 0}
+
+        _, bound_data = self._read_tensors('experiment_random_states_bounds',
+                                           'experiment-episode-{}-bounds'.format(episode_num))
+        data_values = self._get_experiment_values(episode_num)
+        if not len(bound_data) or data_values is None:
+            # the experiment episodes are returned anyway, so clients can select another one
+            return exp_data
+        exp_data['minState'] = bound_data[0][0, :].tolist()
+        exp_data['maxState'] = bound_data[0][1, :].tolist()
+
+        if max_points is not None and len(data_values) > max_points:
+            grid = self._get_experiment_grid(episode_num, grid_size)
+            exp_data['grid'] = {key: value.tolist() if isinstance(value, np.ndarray) else value
+                                for key, value in grid.items()
+                                if key not in ('cells', 'order', 'starts')}
+        elif encoding is None:
+            exp_data['values'] = data_values.tolist()
+        else:
+            exp_data['columns'] = [self._encode_array(column, encoding)
+                                   for column in data_values.T]
+        return exp_data
+
+    def _get_experiment_values(self, episode_num):
+        """A method to return the samples of a random states experiment, see
+        get_experiment_random_states_tensors for the columns.
+        Params:
+            episode_num: int
+                The episode in which the random states experiment was held.
+        Returns:
+            data_values: np.ndarray
+                A [samples, columns] matrix or None if the experiment does not exist.
+        """
+        return self._cached(('experiment_values', episode_num),
+                            lambda: self._read_experiment_values(episode_num),
+                            ['experiment-episode-{}'.format(episode_num)])
+
+    def _read_experiment_values(self, episode_num):
+        """A method to read the samples of a random states experiment, see
+        _get_experiment_values."""
+        _, data_values = self._read_tensors('experiment_random_states',
+                                            'experiment-episode-{}'.format(episode_num))
+        if not len(data_values):
+            return None
+        data_values = np.array(data_values[0], dtype=np.float64)
+        # calculate 1-normalized entropy to get confidence of being correct prediction
+        entropy_preds = data_values[:, 3]
+        entropy_range = entropy_preds.max() - entropy_preds.min()
+        data_values[:, 3] = 1 - (entropy_preds - entropy_preds.min()) / entropy_range \
+            if entropy_range > 0 else 1
+        return data_values
+
+    def _get_experiment_grid(self, episode_num, grid_size):
+        """A method to aggregate the samples of a random states experiment into the cells of a
+        square grid over the range of the two reduced dimensions.
+        Params:
+            episode_num: int
+                The episode in which the random states experiment was held.
+            grid_size: int
+                The number of cells per dimension.
+        Returns:
+            grid: dict
+                The aggregates of the non empty cells (see get_experiment_random_states_tensors)
+                and for drill-downs the sorted cell ids (cell_x * grid_size + cell_y) "cells",
+                the sample indices sorted by cell "order" and the start of every cell in order
+                "starts", or None if the experiment does not exist.
+        """
+        return self._cached(('experiment_grid', episode_num, grid_size),
+                            lambda: self._build_experiment_grid(episode_num, grid_size),
+                            ['experiment-episode-{}'.format(episode_num)])
+
+    def _build_experiment_grid(self, episode_num, grid_size):
+        """A method to build the aggregation grid of an experiment, see _get_experiment_grid."""
+        data_values = self._get_experiment_values(episode_num)
+        if data_values is None:
+            return None
+        grid = {'size': grid_size, 'numPoints': len(data_values)}
+        cell_coords = []
+        for dim, range_name in ((0, 'xRange'), (1, 'yRange')):
+            coords = data_values[:, dim]
+            low, high = coords.min(), coords.max()
+            grid[range_name] = [float(low), float(high)]
+            scale = grid_size / (high - low) if high > low else 0
+            cell_coords.append(np.minimum(((coords - low) * scale).astype(np.int64), grid_size - 1))
+        cell_ids = cell_coords[0] * grid_size + cell_coords[1]
+
+        cells, inverse, counts = np.unique(cell_ids, return_inverse=True, return_counts=True)
+        actions = data_values[:, 2].astype(np.int64)
+        num_actions = actions.max() + 1
+        action_counts = np.bincount(inverse * num_actions + actions,
+                                    minlength=len(cells) * num_actions)
+        grid['cellX'] = cells // grid_size
+        grid['cellY'] = cells % grid_size
+        grid['counts'] = counts
+        grid['meanConfidence'] = np.bincount(inverse, weights=data_values[:, 3]) / counts
+        grid['majorityAction'] = np.argmax(action_counts.reshape(len(cells), num_actions), axis=1)
+        grid['cells'] = cells
+        grid['order'] = np.argsort(inverse, kind='stable')
+        grid['starts'] = np.concatenate(([0], np.cumsum(counts)))
+        return grid
+
+    def _read_tensors(self, plugin_name, tag):
+        """A method to read the tensors of a single tag of a plugin.
+        Params:
+            plugin_name: string
+                The plugin under which the tensors were logged.
+            tag: string
+                The tag of the tensors.
+        Returns:
+            steps, tensordata: (np.ndarray, sequence)
+                The logged steps and the tensor per step, empty if the tag does not exist.
+        """
+        return self.backend.read_tensors(plugin_name, tag)
+
+    def _get_confidence_index(self):
+        """A method to return the index from experiment episode and sample index to the blob
+        key of the sample's image. Only experiments which were logged since the last call are
+        read, instead of all images of the run.
+        Returns:
+            confidence_index: dict
+                A dict of the form {episode: [blob key per sample index]}.
+        """
+        return self._cached(('confidence_index',), self._build_confidence_index)
+
+    def _build_confidence_index(self):
+        """A method to build the confidence index, see _get_confidence_index."""
+        image_tags = self.backend.list_tags(meta_image.PLUGIN_NAME)
+        confidence_index = {}
+        for tag, tag_info in image_tags.items():
+            if not tag.startswith('random-state-ep-'):
+                continue
+            max_step, blob_keys = self._confidence_samples.get(tag, (None, None))
+            if max_step != tag_info['maxStep']:
+                max_step = tag_info['maxStep']
+                blob_keys = [blob_key for _, blob_key in self._get_image_blob_keys(tag)]
+                self._confidence_samples[tag] = (max_step, blob_keys)
+            confidence_index[int(tag.split('-')[-1])] = blob_keys
+        return confidence_index
+
+    def _get_confidence_thumbnails(self, episode_num, indices, size):
+        """A method to return the thumbnails of some samples of an experiment. Only the
+        thumbnails which are not cached on disk yet are rendered, by a worker pool.
+        Params:
+            episode_num: int
+                The episode in which the random states experiment was held.
+            indices: list
+                The indices of the samples within the experiment.
+            size: int
+                The maximum edge length of the thumbnails, one of THUMBNAIL_SIZES.
+        Returns:
+            thumbnails: dict
+                The png encoded thumbnail per index, samples which do not exist are left out.
+        Raises:
+            ValueError: for sizes which are not in THUMBNAIL_SIZES
+        """
+        if size not in self.THUMBNAIL_SIZES:
+            raise ValueError("Unsupported thumbnail size " + str(size))
+        blob_keys = self._get_confidence_index().get(episode_num, [])
+        indices = sorted({index for index in indices if 0 <= index < len(blob_keys)})
+        if not indices:
+            return {}
+        thumbnail_dir = os.path.join(self.data_cache_dir, 'thumbnails',
+                                     'experiment-{}-{}'.format(episode_num, size))
+        thumbnail_paths = {index: os.path.join(thumbnail_dir, '{}.png'.format(index)) for index in indices}
+        missing = [index for index in indices if not os.path.exists(thumbnail_paths[index])]
+        if missing:
+            os.makedirs(thumbnail_dir, exist_ok=True)
+            list(_get_thumbnail_executor().map(
+                _write_thumbnail, [self.backend.read_blob(blob_keys[index]) for index in missing],
+                [thumbnail_paths[index] for index in missing], [size] * len(missing)))
+        thumbnails = {}
+        for index in indices:
+            with open(thumbnail_paths[index], 'rb') as thumbnail_file:
+                thumbnails[index] = thumbnail_file.read()
+        return thumbnails
+
+    def _get_experiment_episodes(self):
+        """A method to return the sorted episodes in which a random states experiment was held."""
+        return sorted(int(experiment_id.split('-')[-1])
+                      for experiment_id in self.backend.list_tags('experiment_random_states'))
+
+    def _cached(self, key, compute, tags=None):
+        """A method to return a cached value, which is computed again once data is logged under
+        the tags it is computed from or after it was evicted by the memory budget.
+        Params:
+            key: tuple
+                The key of the cached value.
+            compute: function
+                A function without arguments, which computes the value.
+            tags: list
+                The tags the value is computed from, None if it depends on all data of the run
+                and is computed again after every reload.
+        Returns:
+            value: the cached or computed value
+        """
+        with self._get_lock(key):
+            version, value = self._cache.get(key, (None, None))
+            current_version = self._get_version(tags)
+            if version != current_version:
+                value = compute()
+                self._cache[key] = (current_version, value)
+                # might evict the value right away, if it alone exceeds the memory limit
+                self.memory_budget.add(self, key, _estimate_nbytes(value), key[0])
+            else:
+                self.memory_budget.touch(self, key)
+            return value
+
+    def _get_version(self, tags=None):
+        """A method to return the version of the data logged under some tags, see _tag_versions.
+        Params:
+            tags: list
+                The tags, None for the version of all data of the run.
+        Returns:
+            version: int or list
+        """
+        if tags is None:
+            return self.data_version
+        return [self._tag_versions.get(tag) for tag in tags]
+
+    def _get_lock(self, key):
+        """A method to return the lock of a cache key, so that concurrent requests compute a
+        value only once, while values of other keys are computed in parallel.
+        Params:
+            key: tuple
+                The key of the cached value.
+        Returns:
+            lock: threading.RLock
+        """
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.RLock())
+
+    @staticmethod
+    def _encode_array(array, encoding):
+        """A method to encode a numpy array as a base64 little endian buffer.
+        Params:
+            array: np.ndarray
+                The array to encode.
+            encoding: string
+                The dtype of the buffer, one of ARRAY_ENCODINGS.
+        Returns:
+            encoded_array: dict
+                A dict of the form {"dtype": string, "shape": list, "data": string}, where data
+                can be decoded into e.g. a Float32Array for the float32 encoding.
+        Raises:
+            ValueError: for encodings which are not in ARRAY_ENCODINGS
+        """
+        if encoding not in DataPreprocessor.ARRAY_ENCODINGS:
+            raise ValueError("Unknown encoding " + str(encoding))
+        buffer = np.ascontiguousarray(array, dtype='<f4' if encoding == 'float32' else '<f2')
+        return {'dtype': encoding, 'shape': list(buffer.shape),
+                'data': base64.b64encode(buffer.tobytes()).decode('ascii')}
+
+    def _get_image_blob_keys(self, tag):
+        """A method to return the blob keys of the images logged under a single tag.
+        Only the given tag is read instead of the whole images plugin.
+        Params:
+            tag: string
+                The tag under which the images were logged.
+        Returns:
+            blob_keys: list
+                A list of (step, blob_key) tuples, one per logged image.
+        """
+        images = self.backend.read_blob_sequences(meta_image.PLUGIN_NAME, tag)
+        if not images:
+            print("Images logged with the tag " + str(tag) + " do not exist.")
+        # image summaries are sequences of [width, height, png data]
+        return [(step, image_blob_keys[2]) for step, image_blob_keys in images
+                if len(image_blob_keys) > 2]
+
+    def _get_data_cache_dir(self):
+        """A method to return the cache directory for renderings of the current event files.
+        The names of event files contain their creation time, so the directory changes, once the
+        logdir is cleared and trained into again.
+        Returns:
+            data_cache_dir: string
+        """
+        event_files = sorted(name for name in os.listdir(self.log_dir)
+                             if io_wrapper.IsSummaryEventsFile(os.path.join(self.log_dir, name))) \
+            if os.path.isdir(self.log_dir) else []
+        return os.path.join(self.cache_dir, hashlib.sha1(
+            '\n'.join(event_files).encode('utf-8')).hexdigest()[:16])
+
+    def _write_cache_file(self, cache_path, data):
+        """A method to atomically write data to a file in the disk cache.
+        Params:
+            cache_path: string
+                The path of the cache file.
+            data: bytes
+                The data to be cached.
+        """
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+        with os.fdopen(tmp_fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, cache_path)
+
+
+def discover_runs(log_dir):
+    """Find all runs in a log directory. A run is a directory containing event files.
+    Params:
+        log_dir: string
+            The log directory, which is searched recursively.
+    Returns:
+        run_dirs: dict
+            A dict of the form {run_name: run_dir}, where the run name is the path of the run
+            relative to log_dir, "." for event files directly within log_dir.
+    """
+    return {os.path.relpath(run_dir, log_dir): run_dir
+            for run_dir in io_wrapper.GetLogdirSubdirectories(log_dir)}
+
+
+def load_runs(log_dir, cache_dir=None, data_preprocessors=None, max_workers=None, load_workers=1,
+              backend=None, memory_budget=None):
+    """Load all runs of a log directory in parallel. Runs which are already loaded are reloaded.
+    Params:
+        log_dir: string
+            The log directory.
+        cache_dir: string
+            The cache directory passed to every DataPreprocessor.
+        data_preprocessors: dict
+            The already loaded runs of the form {run_name: DataPreprocessor}.
+        max_workers: int
+            The maximum number of runs loaded at the same time, None for the default
+            of ThreadPoolExecutor.
+        load_workers: int
+            The number of processes parsing event files, see DataPreprocessor.
+        backend: string
+            The name of the backend reading the runs, one of BACKENDS. None selects the
+            columnar backend for more than one load worker or a memory limit and the
+            multiplexer otherwise.
+        memory_budget: MemoryBudget
+            The memory budget shared by all runs, None for a budget per run without a limit.
+    Returns:
+        data_preprocessors: dict
+            A new dict of the form {run_name: DataPreprocessor} with all runs. If log_dir contains
+            no event files, it is a single (empty) run named ".".
+    """
+    data_preprocessors = dict(data_preprocessors or {})
+    run_dirs = discover_runs(log_dir) or {'.': log_dir}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        new_runs = {run: executor.submit(DataPreprocessor, run_dir, cache_dir, load_workers, backend,
+                                               memory_budget)
+                    for run, run_dir in run_dirs.items() if run not in data_preprocessors}
+        reloads = [executor.submit(data_preprocessor.reload)
+                   for data_preprocessor in data_preprocessors.values()]
+        for reload in reloads:
+            reload.result()
+        for run, new_run in new_runs.items():
+            data_preprocessors[run] = new_run.result()
+    return data_preprocessors
+
+
+def compare_runs(data_preprocessors, tag, max_points=None):
+    """Align the scalar values of a tag across several runs.
+    Params:
+        data_preprocessors: dict
+            The runs to compare of the form {run_name: DataPreprocessor}.
+        tag: string
+            The tag of the scalar values.
+        max_points: int
+            None to return the values at the union of all logged steps. Otherwise the step range
+            is split into max_points equally wide bins and the mean per bin and run is returned.
+    Returns:
+        aligned: dict
+            A dict of the form {"steps": list, "runs": {run_name: list}}, where every list of
+            values has one entry per step, None where a run has no value. For bins, the steps
+            are the first step of every bin. Runs without the tag are left out.
+    """
+    series = {}
+    for run, data_preprocessor in data_preprocessors.items():
+        steps, values = data_preprocessor.get_scalar_arrays(tag)
+        if steps is not None:
+            series[run] = (steps, values)
+    if not series:
+        return {'steps': [], 'runs': {}}
+
+    all_steps = np.unique(np.concatenate([steps for steps, _ in series.values()]))
+    if max_points is not None and len(all_steps) > max_points:
+        first, last = all_steps[0], all_steps[-1]
+        bin_width = (last - first) / max_points
+        aligned_steps = first + np.arange(max_points) * bin_width
+        aligned = {}
+        for run, (steps, values) in series.items():
+            bins = np.minimum(((steps - first) / bin_width).astype(np.int64), max_points - 1)
+            counts = np.bincount(bins, minlength=max_points)
+            sums = np.bincount(bins, weights=values, minlength=max_points)
+            means = sums / np.maximum(counts, 1)
+            aligned[run] = [mean if count else None for mean, count in zip(means.tolist(), counts.tolist())]
+        return {'steps': aligned_steps.tolist(), 'runs': aligned}
+
+    aligned = {}
+    for run, (steps, values) in series.items():
+        positions = np.searchsorted(all_steps, steps)
+        run_values = np.full(len(all_steps), np.nan)
+        run_values[positions] = values
+        aligned[run] = [None if np.isnan(value) else value for value in run_values.tolist()]
+    return {'steps': all_steps.tolist(), 'runs': aligned}
+
+
+def _estimate_nbytes(value):
+    """Estimate the bytes held by a (nested) value, memory mapped arrays are not counted."""
+    if isinstance(value, np.memmap):
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_estimate_nbytes(item) + 8 for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_estimate_nbytes(item) + 8 for item in value)
+    # ints, floats and None
+    return 24
+
+
+class MemoryBudget:
+    """Tracks the approximate bytes of the decoded data held by DataPreprocessors and their
+    backends. Once the limit is exceeded, the least recently used data is evicted: arrays of the
+    columnar backend are spilled to memory mapped files, whose pages the OS can reclaim, and
+    cached values are dropped and computed again on their next request. Scalar series are always
+    kept in memory."""
+
+    def __init__(self, limit=None, spill_dir=None):
+        """
+        Params:
+            limit: int
+                The maximum number of bytes, None only tracks the usage.
+            spill_dir: string
+                The directory of the spill files, defaults to the system temp directory.
+        """
+        self.limit = limit
+        self.spill_dir = spill_dir if spill_dir is not None else tempfile.gettempdir()
+        # (owner, key) -> (category, nbytes), ordered from least to most recently used
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.used = 0
+        self.spilled = 0
+        self.evictions = 0
+
+    def add(self, owner, key, nbytes, category):
+        """Track (or update) the bytes of an entry and evict entries if the limit is exceeded.
+        Params:
+            owner: DataPreprocessor or ColumnarBackend
+                The holder of the data, whose release(key) method is called on eviction.
+            key: hashable
+                The key of the data within the owner.
+            nbytes: int
+                The approximate size of the data.
+            category: string
+                The category the bytes are reported under, e.g. the plugin.
+        """
+        with self._lock:
+            _, old_nbytes = self._entries.pop((owner, key), (None, 0))
+            self._entries[(owner, key)] = (category, nbytes)
+            self.used += nbytes - old_nbytes
+            while self.limit is not None and self.used > self.limit and self._entries:
+                (evicted_owner, evicted_key), (_, evicted_nbytes) = self._entries.popitem(last=False)
+                self.used -= evicted_nbytes
+                self.evictions += 1
+                evicted_owner.release(evicted_key)
+
+    def touch(self, owner, key):
+        """Mark an entry as most recently used."""
+        with self._lock:
+            if (owner, key) in self._entries:
+                self._entries.move_to_end((owner, key))
+
+    def make_room(self, nbytes):
+        """Evict the least recently used entries until nbytes more fit into the limit.
+        Params:
+            nbytes: int
+                The size of data about to be loaded.
+        Returns:
+            fits: bool
+                Whether the data fits into the limit, otherwise it should be spilled right away.
+        """
+        with self._lock:
+            while self.limit is not None and self.used + nbytes > self.limit and self._entries:
+                (evicted_owner, evicted_key), (_, evicted_nbytes) = self._entries.popitem(last=False)
+                self.used -= evicted_nbytes
+                self.evictions += 1
+                evicted_owner.release(evicted_key)
+            return self.limit is None or self.used + nbytes <= self.limit
+
+    def spill(self, *arrays):
+        """Write arrays concatenated along their first axis to a spill file.
+        Returns:
+            spilled_array: np.memmap
+                A read only memory mapped copy of the concatenated arrays.
+        """
+        shape = (sum(len(array) for array in arrays),) + arrays[0].shape[1:]
+        if not all(shape):
+            return np.concatenate(arrays)
+        with tempfile.NamedTemporaryFile(dir=self.spill_dir, prefix='drlvis-spill-', delete=False) as spill_file:
+            for array in arrays:
+                np.ascontiguousarray(array).tofile(spill_file)
+        spilled_array = np.memmap(spill_file.name, dtype=arrays[0].dtype, mode='r', shape=shape)
+        try:
+            # the mapping stays valid, the file is freed as soon as it is not mapped anymore
+            os.unlink(spill_file.name)
+        except OSError:
+            pass
+        self.spilled += spilled_array.nbytes
+        return spilled_array
+
+    def get_usage(self):
+        """Return the tracked memory usage.
+        Returns:
+            usage: dict
+                A dict of the form {"limit": int, "used": int, "spilled": int, "evictions": int,
+                "categories": {category: int}}, where used are the tracked bytes in memory,
+                spilled the bytes written to spill files and evictions the number of evicted
+                entries so far. categories splits the used bytes e.g. by plugin.
+        """
+        with self._lock:
+            categories = {}
+            for category, nbytes in self._entries.values():
+                categories[category] = categories.get(category, 0) + nbytes
+            return {'limit': self.limit, 'used': self.used, 'spilled': self.spilled,
+                    'evictions': self.evictions, 'categories': categories}
+
+
+class DataBackend:
+    """The interface through which a DataPreprocessor reads the data of its run. Backends only
+    list and read the logged summaries, the tag and episode index is built from list_tags by the
+    DataPreprocessor. Missing plugins and tags are returned as empty results, never raised."""
+
+    def reload(self):
+        """Load the data logged since the last (re)load."""
+        raise NotImplementedError
+
+    def list_plugins(self):
+        """Return the sorted names of the plugins with logged data."""
+        raise NotImplementedError
+
+    def list_tags(self, plugin_name):
+        """Return the tags of a plugin.
+        Params:
+            plugin_name: string
+                The plugin under which the tags were logged.
+        Returns:
+            tags: dict
+                A dict of the form {tag: {"maxStep": int, "wallTime": float}} with the last logged
+                step and wall time per tag.
+        """
+        raise NotImplementedError
+
+    def read_scalars(self, tag):
+        """Return the scalar values of a tag.
+        Returns:
+            steps, values: (np.ndarray, np.ndarray)
+                The int64 steps and float64 values, which must not be modified.
+        """
+        raise NotImplementedError
+
+    def read_tensors(self, plugin_name, tag):
+        """Return the tensors of a tag.
+        Returns:
+            steps, tensors: (np.ndarray, sequence)
+                The int64 steps and one numpy array per step.
+        """
+        raise NotImplementedError
+
+    def read_blob_sequences(self, plugin_name, tag):
+        """Return the blob keys of a tag.
+        Returns:
+            blob_sequences: list
+                A list of (step, blob_keys) tuples, where blob_keys is a tuple of strings which can
+                be passed to read_blob.
+        """
+        raise NotImplementedError
+
+    def read_blob(self, blob_key):
+        """Return the bytes of a blob listed by read_blob_sequences."""
+        raise NotImplementedError
+
+
+class ProviderBackend(DataBackend):
+    """A backend reading the run "." of a tensorboard DataProvider."""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.ctx = context.RequestContext()
+        self.inf = 1000000000
+
+    def reload(self):
+        pass
+
+    def list_plugins(self):
+        return sorted(self.provider.list_plugins(self.ctx, experiment_id="unused"))
+
+    def list_tags(self, plugin_name):
+        tags = {}
+        # the listings of a data class only contain the tags of that data class
+        for list_time_series in (self.provider.list_scalars, self.provider.list_tensors,
+                                 self.provider.list_blob_sequences):
+            time_series = list_time_series(self.ctx, experiment_id="unused", plugin_name=plugin_name)
+            for tag, series in time_series.get('.', {}).items():
+                tags[tag] = {'maxStep': series.max_step, 'wallTime': series.max_wall_time}
+        return tags
+
+    def read_scalars(self, tag):
+        scalars = self.provider.read_scalars(
+            self.ctx, experiment_id="unused", plugin_name=meta_scalar.PLUGIN_NAME, downsample=self.inf,
+            run_tag_filter=base_provider.RunTagFilter(runs=['.'], tags=[tag])).get('.', {}).get(tag, [])
+        return (np.fromiter((scalar.step for scalar in scalars), dtype=np.int64, count=len(scalars)),
+                np.fromiter((scalar.value for scalar in scalars), dtype=np.float64, count=len(scalars)))
+
+    def read_tensors(self, plugin_name, tag):
+        tensors = self.provider.read_tensors(
+            self.ctx, experiment_id="unused", plugin_name=plugin_name, downsample=self.inf,
+            run_tag_filter=base_provider.RunTagFilter(runs=['.'], tags=[tag])).get('.', {}).get(tag, [])
+        return (np.fromiter((tensor.step for tensor in tensors), dtype=np.int64, count=len(tensors)),
+                [tensor.numpy for tensor in tensors])
+
+    def read_blob_sequences(self, plugin_name, tag):
+        blob_sequences = self.provider.read_blob_sequences(
+            self.ctx, experiment_id="unused", plugin_name=plugin_name, downsample=self.inf,
+            run_tag_filter=base_provider.RunTagFilter(runs=['.'], tags=[tag])).get('.', {}).get(tag, [])
+        return [(blob_sequence.step, tuple(blob.blob_key for blob in blob_sequence.values))
+                for blob_sequence in blob_sequences]
+
+    def read_blob(self, blob_key):
+        return self.provider.read_blob(self.ctx, blob_key=blob_key)
+
+
+class MultiplexerBackend(ProviderBackend):
+    """A backend loading the event files of a run with the tensorboard event multiplexer."""
+
+    def __init__(self, log_dir, load_workers=1, memory_budget=None):
+        super().__init__(None)
         sizes = {
             "distributions": self.inf,
             "images": self.inf,
@@ -427,40 +2145,377 @@ class DataPreprocessor:
             "histograms": self.inf,
             "tensors": self.inf,
         }
-        multiplexer = event_multiplexer.EventMultiplexer(
+        self.multiplexer = event_multiplexer.EventMultiplexer(
             size_guidance=sizes)
-        multiplexer.AddRunsFromDirectory(self.log_dir)
-        multiplexer.Reload()
-        return multiplexer
+        # every run has its own data preprocessor, so only the event files of log_dir belong to it
+        self.multiplexer.AddRun(log_dir, name='.')
+        self.multiplexer.Reload()
+        self.provider = data_provider.MultiplexerDataProvider(self.multiplexer, log_dir)
+
+    def reload(self):
+        self.multiplexer.Reload()
+
+
+class DataServerBackend(ProviderBackend):
+    """A backend reading a run through a tensorboard data server (rustboard) subprocess, which
+    loads the event files in native code and polls them for new data by itself. The server only
+    keeps all summaries of the plugins it was started with, so it is restarted when other
+    plugins (e.g. custom distributions) appear. Like the multiplexer, it drops the summaries of
+    a restarted training at steps which were logged again."""
+
+    PLUGINS = ('scalars', 'images', 'action_probs', 'action_meanings', 'action_distributions',
+               'weights', 'experiment_random_states', 'experiment_random_states_bounds',
+               'experiment_random_states_state_meanings')
+    # seconds the server sleeps between polling the event files
+    POLL_INTERVAL = 1
+    # maximum number of seconds to wait for the server to load the event files after starting
+    LOAD_TIMEOUT = 600
+
+    def __init__(self, log_dir, load_workers=1, memory_budget=None):
+        super().__init__(None)
+        self.log_dir = log_dir
+        self._plugins = set(self.PLUGINS)
+        self._process = None
+        self._start()
+
+    def reload(self):
+        new_plugins = set(self.list_plugins()) - self._plugins
+        if new_plugins:
+            self._plugins.update(new_plugins)
+            self._start()
+
+    def _start(self):
+        """Start a new data server and wait until it loaded the event files."""
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+        server_binary = server_ingester.get_server_binary()
+        with tempfile.TemporaryDirectory(prefix="drlvis-data-server") as tmp_dir:
+            port_file_path = os.path.join(tmp_dir, "port")
+            self._process = subprocess.Popen([
+                server_binary.path, "--logdir=" + self.log_dir,
+                "--reload={}".format(self.POLL_INTERVAL),
+                "--samples-per-plugin=" + ",".join(plugin + "=all" for plugin in sorted(self._plugins)),
+                "--port=0", "--port-file=" + port_file_path, "--die-after-stdin"],
+                stdin=subprocess.PIPE)
+            port = ""
+            while not port.endswith("\n"):
+                if self._process.poll() is not None:
+                    raise server_ingester.DataServerStartupError(
+                        "exited with {}".format(self._process.returncode))
+                time.sleep(0.05)
+                if os.path.exists(port_file_path):
+                    with open(port_file_path) as port_file:
+                        port = port_file.read()
+        address = "localhost:{}".format(int(port))
+        self.provider = grpc_provider.GrpcDataProvider(
+            address, grpc_provider.make_stub(grpc.insecure_channel(address)))
+
+        # the server loads in the background, it is done once the tags stop changing
+        tags = None
+        deadline = time.time() + self.LOAD_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(self.POLL_INTERVAL / 2)
+            new_tags = {plugin: self.list_tags(plugin) for plugin in self.list_plugins()}
+            if new_tags == tags:
+                break
+            tags = new_tags
+
+
+_load_executor = None
+
+
+def _get_load_executor(load_workers):
+    """Return the process pool parsing event files, which is shared by all runs."""
+    global _load_executor
+    if _load_executor is None:
+        # spawn instead of fork, as the server forks while other threads hold locks
+        _load_executor = ProcessPoolExecutor(
+            max_workers=load_workers, mp_context=multiprocessing.get_context('spawn'))
+    return _load_executor
+
+
+_thumbnail_executor = None
+
+
+def _get_thumbnail_executor():
+    """Return the thread pool rendering thumbnails, which is shared by all runs.
+    Pillow releases the GIL while resizing and encoding."""
+    global _thumbnail_executor
+    if _thumbnail_executor is None:
+        _thumbnail_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+    return _thumbnail_executor
+
+
+def _write_thumbnail(frame_raw, thumbnail_path, size):
+    """Downscale a png image, so its longer edge is at most size pixels, and write it to a file.
+    Params:
+        frame_raw: bytes
+            The png encoded image.
+        thumbnail_path: string
+            The path of the written thumbnail.
+        size: int
+            The maximum edge length of the thumbnail.
+    """
+    image = Image.open(io.BytesIO(frame_raw))
+    image.thumbnail((size, size), Image.LANCZOS)
+    # written to a temporary file first, so concurrent requests never read a partial thumbnail
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(thumbnail_path), suffix='.tmp', delete=False) as tmp_file:
+        image.save(tmp_file, format='PNG', optimize=True)
+    os.replace(tmp_file.name, thumbnail_path)
+
+
+def _read_records(path, offset):
+    """Read the records of a TFRecord (event) file starting at a record boundary one by one,
+    so the file is never held in memory as a whole.
+    Params:
+        path: string
+            The path of the event file.
+        offset: int
+            The byte offset of the first record to read.
+    Returns:
+        records: generator
+            Yields (record, offset) of every complete record, where offset is the offset after it.
+    """
+    with open(path, 'rb') as event_file:
+        event_file.seek(offset)
+        # every record is: uint64 length, uint32 crc of length, data, uint32 crc of data
+        while True:
+            header = event_file.read(12)
+            if len(header) < 12:
+                return
+            length, = struct.unpack_from('<Q', header)
+            record = event_file.read(length)
+            if len(record) < length or len(event_file.read(4)) < 4:
+                return
+            offset += 12 + length + 4
+            yield record, offset
 
-    def _create_provider(self):
-        """A method to create a dataprovider
 
+def _parse_event_file(path, offset, tag_plugins):
+    """Parse the summaries of an event file into numpy arrays. This runs in a worker process,
+    the arrays are handed back in one shared memory block.
+    Params:
+        path: string
+            The path of the event file.
+        offset: int
+            The byte offset to continue parsing at.
+        tag_plugins: dict
+            The plugin per tag known from earlier parsing, as the plugin is only logged
+            with the first summary of a tag.
+    Returns:
+        parsed: dict
+            A dict of the form {"offset": int, "tagPlugins": dict, "shm": string, "arrays": list,
+            "objects": dict}, where arrays describes the arrays in the shared memory block named
+            shm by (plugin, tag, field, dtype, shape, start) and objects contains the values of
+            tensors which could not be stacked into one array.
+    """
+    tag_plugins = dict(tag_plugins)
+    summaries = {}
+    for record, offset in _read_records(path, offset):
+        event = event_pb2.Event.FromString(record)
+        if not event.HasField('summary'):
+            continue
+        for value in event.summary.value:
+            value = data_compat.migrate_value(value)
+            if value.metadata.plugin_data.plugin_name:
+                tag_plugins[value.tag] = value.metadata.plugin_data.plugin_name
+            if not value.HasField('tensor') or value.tag not in tag_plugins:
+                continue
+            summary = summaries.setdefault((tag_plugins[value.tag], value.tag), ([], [], []))
+            summary[0].append(event.step)
+            summary[1].append(event.wall_time)
+            summary[2].append(tensor_util.make_ndarray(value.tensor))
+
+    arrays = {}
+    objects = {}
+    for (plugin, tag), (steps, wall_times, values) in summaries.items():
+        arrays[(plugin, tag, 'steps')] = np.array(steps, dtype=np.int64)
+        arrays[(plugin, tag, 'wall_times')] = np.array(wall_times, dtype=np.float64)
+        if plugin == meta_image.PLUGIN_NAME:
+            # blob sequences: number of blobs per datum, length per blob and all bytes
+            blobs = [bytes(blob) for value in values for blob in value.ravel()]
+            arrays[(plugin, tag, 'counts')] = np.array([value.size for value in values], dtype=np.int64)
+            arrays[(plugin, tag, 'lengths')] = np.array([len(blob) for blob in blobs], dtype=np.int64)
+            arrays[(plugin, tag, 'data')] = np.frombuffer(b''.join(blobs), dtype=np.uint8)
+        elif plugin == meta_scalar.PLUGIN_NAME:
+            arrays[(plugin, tag, 'values')] = np.array([value.item() for value in values], dtype=np.float64)
+        elif len({(value.shape, value.dtype) for value in values}) == 1 and values[0].dtype != object:
+            arrays[(plugin, tag, 'values')] = np.stack(values)
+        else:
+            objects[(plugin, tag)] = values
+
+    manifest = []
+    start = 0
+    for (plugin, tag, field), array in arrays.items():
+        manifest.append((plugin, tag, field, array.dtype.str, array.shape, start))
+        start += -(-array.nbytes // 8) * 8
+    shm_name = None
+    if start:
+        shm = shared_memory.SharedMemory(create=True, size=start)
+        for (plugin, tag, field, dtype, shape, array_start), array in zip(manifest, arrays.values()):
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=array_start)[...] = array
+        shm_name = shm.name
+        shm.close()
+        # the parent process takes over the block and unlinks it, the tracker knows posix
+        # blocks by their name with a leading slash
+        resource_tracker.unregister('/' + shm_name if os.name == 'posix' else shm_name, 'shared_memory')
+    return {'offset': offset, 'tagPlugins': tag_plugins, 'shm': shm_name,
+            'arrays': manifest, 'objects': objects}
+
+
+class ColumnarBackend(DataBackend):
+    """A backend keeping all summaries of a run as numpy arrays per tag. The event files are
+    parsed in parallel worker processes and reloads only parse the newly written records.
+    In contrast to the multiplexer, data of restarted trainings is kept instead of being purged."""
+
+    # the fields of the time series, which are spilled when they exceed the memory budget
+    SPILLED_FIELDS = ('values', 'data')
+
+    def __init__(self, log_dir, load_workers=1, memory_budget=None):
+        self.log_dir = log_dir
+        self.load_workers = load_workers
+        self.memory_budget = memory_budget if memory_budget is not None else MemoryBudget()
+        self._offsets = {}
+        self._tag_plugins = {}
+        # (plugin, tag) -> dict of the arrays of the time series. Both the mapping and the dicts
+        # are replaced instead of being changed by reloads, as requests read them concurrently.
+        self._series = {}
+        self.reload()
+
+    def reload(self):
+        """Parse all records written since the last (re)load, one event file per worker."""
+        paths = sorted(os.path.join(self.log_dir, name) for name in os.listdir(self.log_dir)
+                       if io_wrapper.IsSummaryEventsFile(os.path.join(self.log_dir, name)))
+        executor = _get_load_executor(self.load_workers)
+        futures = [executor.submit(_parse_event_file, path, self._offsets.get(path, 0), self._tag_plugins)
+                   for path in paths]
+        # merge in file order, event file names start with their creation time
+        for path, future in zip(paths, futures):
+            parsed = future.result()
+            self._offsets[path] = parsed['offset']
+            self._tag_plugins.update(parsed['tagPlugins'])
+            series_map = dict(self._series)
+            merged_keys = self._merge(parsed, series_map)
+            self._series = series_map
+
+            # registered after the swap, so evictions spill the merged arrays
+            for key in sorted(merged_keys):
+                if key[0] == meta_scalar.PLUGIN_NAME:
+                    continue
+                for field in self.SPILLED_FIELDS:
+                    array = series_map[key].get(field)
+                    if isinstance(array, np.ndarray) and not isinstance(array, np.memmap):
+                        self.memory_budget.add(self, key + (field,), array.nbytes, key[0])
+
+    def list_plugins(self):
+        return sorted({plugin for plugin, _ in self._series})
+
+    def list_tags(self, plugin_name):
+        return {tag: {'maxStep': int(series['steps'].max()), 'wallTime': float(series['wall_times'].max())}
+                for (plugin, tag), series in self._series.items() if plugin == plugin_name}
+
+    def read_scalars(self, tag):
+        series = self._series.get((meta_scalar.PLUGIN_NAME, tag))
+        if series is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return series['steps'], series['values']
+
+    def read_tensors(self, plugin_name, tag):
+        series = self._series.get((plugin_name, tag))
+        if series is None:
+            return np.empty(0, dtype=np.int64), []
+        self.memory_budget.touch(self, (plugin_name, tag, 'values'))
+        return series['steps'], series['values']
+
+    def read_blob_sequences(self, plugin_name, tag):
+        series = self._series.get((plugin_name, tag))
+        if series is None:
+            return []
+        datum_starts = series['datum_starts'].tolist()
+        return [(step, tuple(json.dumps([plugin_name, tag, blob])
+                             for blob in range(datum_starts[index], datum_starts[index + 1])))
+                for index, step in enumerate(series['steps'].tolist())]
+
+    def read_blob(self, blob_key):
+        plugin_name, tag, blob = json.loads(blob_key)
+        series = self._series[(plugin_name, tag)]
+        self.memory_budget.touch(self, (plugin_name, tag, 'data'))
+        return series['data'][series['blob_starts'][blob]:series['blob_starts'][blob + 1]].tobytes()
+
+    def _merge(self, parsed, series_map):
+        """Add the arrays parsed by a worker to the time series.
+        Params:
+            parsed: dict
+                The result of _parse_event_file.
+            series_map: dict
+                The new mapping of the time series, whose changed series are replaced by new dicts.
         Returns:
-        data_provider: MultiplexerDataProvider
-            The data provider which is being used for data loading inquiries (from file).
+            merged_keys: list
+                The (plugin, tag) of the changed time series.
         """
-        multiplexer = self._create_multiplexer()
-        return data_provider.MultiplexerDataProvider(multiplexer, self.log_dir)
+        chunks = {}
+        shm = None
+        if parsed['shm'] is not None:
+            shm = shared_memory.SharedMemory(name=parsed['shm'])
+            for plugin, tag, field, dtype, shape, start in parsed['arrays']:
+                chunks.setdefault((plugin, tag), {})[field] = np.ndarray(
+                    shape, dtype=dtype, buffer=shm.buf, offset=start)
+        for key, values in parsed['objects'].items():
+            chunks[key]['values'] = values
 
-    def _get_scalars_by_tag(self, tag):
-        """A method to return unprocessed scalar values by tags.
+        # bytes of the spilled fields loaded into memory by this merge, they are added to the
+        # budget after the swap
+        loaded = 0
+        for key, chunk in chunks.items():
+            series = dict(series_map.get(key, {}))
+            for field, array in chunk.items():
+                old = series.get(field)
+                parts = [array] if old is None else [old, array]
+                if not all(isinstance(part, np.ndarray) for part in parts) \
+                        or len({part.shape[1:] for part in parts}) > 1:
+                    # copied, as the values of an array would be views of the shared memory block
+                    series[field] = [value for part in parts for value in
+                                     (np.array(part) if isinstance(part, np.ndarray) else part)]
+                    continue
+                nbytes = sum(part.nbytes for part in parts)
+                # scalars are used by the scalar series of the DataPreprocessor and never spilled
+                if key[0] != meta_scalar.PLUGIN_NAME and field in self.SPILLED_FIELDS \
+                        and not self.memory_budget.make_room(loaded + nbytes):
+                    # written from the shared memory block, without a copy in memory
+                    series[field] = self.memory_budget.spill(*parts)
+                    continue
+                if key[0] != meta_scalar.PLUGIN_NAME and field in self.SPILLED_FIELDS:
+                    loaded += nbytes
+                # copied, so the block can be freed
+                series[field] = np.concatenate(parts)
+            if 'counts' in series:
+                series['datum_starts'] = np.concatenate([[0], np.cumsum(series['counts'])])
+                series['blob_starts'] = np.concatenate([[0], np.cumsum(series['lengths'])])
+            series_map[key] = series
+        merged_keys = list(chunks)
+        # the arrays viewing the shared memory block have to be dropped before it is freed
+        chunks = chunk = array = parts = None
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        return merged_keys
+
+    def release(self, key):
+        """Spill a field of a time series to disk, called by the memory budget to evict it.
         Params:
-            tag: string
-            The tag which shall be used as filter for getting raw values from the log file.
-        Returns:
-            scalars:
-                unprocessed scalar values, should not be used as is
+            key: tuple
+                The (plugin, tag, field) of the array.
         """
-        scalars = []
-        try:
-            scalars = self.provider.read_scalars(self.ctx, plugin_name=meta_scalar.PLUGIN_NAME,
-                                                 downsample=self.inf, experiment_id="unused",
-                                                 run_tag_filter=base_provider.
-                                                 RunTagFilter(tags=[tag]))
+        plugin_name, tag, field = key
+        series = self._series.get((plugin_name, tag))
+        array = None if series is None else series.get(field)
+        if isinstance(array, np.ndarray) and not isinstance(array, np.memmap):
+            # the spilled array has the same content, so it replaces the field in place
+            series[field] = self.memory_budget.spill(array)
 
-            scalars = scalars['.'][tag]
 
-        except KeyError:
-            print("Scalar queried with the tag "+str(tag) + " does not exist.")
-        return {} if scalars == [] else scalars
+# the backends selectable by name, see DataPreprocessor
+BACKENDS = {'multiplexer': MultiplexerBackend,
+            'columnar': ColumnarBackend,
+            'data-server': DataServerBackend}
@@ -14,7 +14,9 @@ def create_logger(logdir):
     """create a logger and select the logging directory
     Important: The directory should only contain one tf.summary file,
     so if one restarts the training procedures, all other log files
-    in the directory should be deleted.
+    in the directory should be deleted. Several runs (e.g. different seeds)
+    can be compared by logging every run into its own subdirectory of the
+    directory passed to drlvis with --logdir.
 
     Params:
         logdir: string
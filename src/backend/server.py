@@ -1,24 +1,443 @@
 """Server that handles all the requests for DRLVis frontend."""
 import argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import gzip
+import hashlib
+import time
 import timeit
-from flask import Flask, request
+from flask import Flask, Response, abort, make_response, request
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 import os
+from urllib.parse import quote
+from threading import Lock, Thread
+import waitress
+try:
+    import brotli
+except ImportError:
+    # brotli is optional, responses are compressed with gzip only
+    brotli = None
 
-from data_preprocessor import DataPreprocessor
+from data_preprocessor import BACKENDS, DataPreprocessor, MemoryBudget, compare_runs, load_runs
 
 APP = Flask(__name__)
 CORS(APP)
 OK_STATUS = 200
 JSON_TYPE = {'ContentType': 'application/json'}
 TEXT_TYPE = {'ContentType': 'text/plain'}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+MULTIPART_BOUNDARY = 'drlvis-frame-boundary'
+# smaller responses are not worth compressing
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/')
+# (etag, content encoding) -> compressed body of an immutable response
+COMPRESSION_CACHE = OrderedDict()
+COMPRESSION_CACHE_SIZE = 1024
+COMPRESSION_CACHE_LOCK = Lock()
+
+BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+# query type -> function answering a query of a batch request for the data preprocessor of a run
+BATCH_QUERIES = {
+    'scalars': lambda data, query: data.get_scalar_values_by_tag(
+        query['tag'], **scalar_args(query)),
+    'multiple_scalars': lambda data, query: data.get_multiple_scalar_values_by_tag(query['tags']),
+    'all_scalars': lambda data, query: data.get_all_scalar_values(),
+    'scalar_range': lambda data, query: data.get_scalar_range(
+        query['tag'], request_args(query).get('from_step', type=int),
+        request_args(query).get('to_step', type=int), int_arg('max_points', 1000, args=query)),
+    'log_tags': lambda data, query: data.get_log_tags(),
+    'timestep_log_tags': lambda data, query: data.get_timestep_log_tags(),
+    'distribution_tags': lambda data, query: data.get_distribution_tags(),
+    'action_distributions': lambda data, query: data.get_action_distributions(
+        **distribution_args(query)),
+    'custom_distribution': lambda data, query: data.get_custom_distributions(
+        query['tag'], **distribution_args(query)),
+    'action_meanings': lambda data, query: data.get_action_meanings(),
+    'probs': lambda data, query: data.get_probs_for_episode(
+        int(query['episode']), query.get('format') == 'columnar', encoding_arg(query),
+        flag_arg('entropy', query), flag_arg('argmax', query)),
+    'weights': lambda data, query: data.get_weights_for_episode(
+        int(query['episode']), encoding_arg(query), int_arg('timestep', minimum=0, args=query)),
+    'weight_summaries': lambda data, query: data.get_weight_summaries(
+        int(query['episode']), int_arg('top_k', 10, args=query)),
+    'experiment_random_states': lambda data, query: data.get_experiment_random_states_tensors(
+        int(query['episode']), encoding_arg(query), int_arg('max_points', args=query),
+        grid_size_arg(query)),
+    'experiment_cell': lambda data, query: data.get_experiment_cell_points(
+        int(query['episode']), int(query['cell_x']), int(query['cell_y']),
+        grid_size_arg(query), encoding_arg(query)),
+    'confidence_frames': lambda data, query: data.get_confidence_frames_batch(
+        int(query['episode']), [int(index) for index in query['indices']],
+        int_arg('size', args=query)),
+    'episode_table': lambda data, query: data.get_episode_table(
+        list_arg('columns', query), request_args(query).get('sort_by', 'episode', type=str),
+        flag_arg('descending', query), int_arg('offset', 0, minimum=0, args=query),
+        int_arg('limit', 100, minimum=0, args=query), request_args(query).get('from_episode', type=int),
+        request_args(query).get('to_episode', type=int), list_arg('where', query)),
+    'query_episodes': lambda data, query: data.query_episodes(
+        list_arg('where', query), request_args(query).get('from_episode', type=int),
+        request_args(query).get('to_episode', type=int), int_arg('limit', minimum=0, args=query)),
+}
+
+
+def versioned(tags=None, episode=None, runs=None, immutable=False):
+    """Decorate an endpoint, whose response only depends on the request and the data logged
+    under some tags, with an ETag derived from the version of that data (see
+    DataPreprocessor.get_data_etag). Requests with a matching If-None-Match are answered
+    with 304 without calling the endpoint.
+    Params:
+        tags: function
+            Returns the tags read by the endpoint given the arguments of the endpoint,
+            None if the response depends on all data of the run
+        episode: function
+            Returns the episode of a per episode endpoint given the arguments of the endpoint,
+            responses for complete episodes are immutable
+        runs: function
+            Returns the names of the runs read by the endpoint given the arguments of the
+            endpoint, defaults to the run requested with ?run=
+        immutable: bool
+            Whether the responses never change, e.g. for experiments logged at once
+    Returns:
+        decorator: function
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        def versioned_endpoint(*args, **kwargs):
+            if runs is None:
+                datas = [preprocessor()]
+            else:
+                # unknown runs are reported by the endpoint
+                datas = [data_preprocessors[run] for run in runs(*args, **kwargs) if run in data_preprocessors]
+            read_tags = None if tags is None else tags(*args, **kwargs)
+            etags = [data.get_data_etag(request.full_path, read_tags) for data in datas]
+            etag = etags[0] if len(etags) == 1 else hashlib.sha1('\n'.join(etags).encode('utf-8')).hexdigest()
+            cache_forever = immutable or (episode is not None and datas[0].is_episode_complete(
+                episode(*args, **kwargs)))
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(endpoint(*args, **kwargs))
+                if response.status_code != OK_STATUS:
+                    return response
+            # weak, as the ETag names the version of the data, not the bytes of the body, which
+            # differ by compression. So 304 responses carry the same ETag as compressed ones
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if cache_forever else REVALIDATE_CACHE_CONTROL
+            return response
+        return versioned_endpoint
+    return decorator
+
+
+def compared_runs():
+    """Return the runs of /compare-runs given as comma separated ?runs=, defaults to all runs"""
+    runs = request.args.get('runs', default=None, type=str)
+    return sorted(data_preprocessors) if runs is None else runs.split(',')
+
+
+def user_episode():
+    """Return the episode of endpoints taking it as user argument"""
+    return int(request.args.get('user'))
+
+
+def compress(body, encoding):
+    """Compress a response body
+    Params:
+        body: bytes
+            The uncompressed body
+        encoding: string
+            The content encoding, br or gzip
+    Returns:
+        compressed_body: bytes
+    """
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+@APP.after_request
+def compress_response(response):
+    """Compress JSON and text responses with the best encoding the client accepts (brotli if
+    installed, else gzip). The compressed bodies of immutable responses are cached.
+    Params:
+        response: Response
+            The uncompressed response
+    Returns:
+        response: Response
+            The response, compressed if it is large enough
+    """
+    if response.status_code != OK_STATUS or response.direct_passthrough \
+            or 'Content-Encoding' in response.headers \
+            or not response.mimetype.startswith(COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+    encoding = next((encoding for encoding in encodings
+                     if request.accept_encodings[encoding] > 0), None)
+    body = response.get_data()
+    if encoding is None or len(body) < COMPRESSION_MIN_SIZE:
+        return response
+
+    etag, _ = response.get_etag()
+    cache_key = (etag, encoding)
+    cacheable = etag is not None and response.headers.get('Cache-Control') == IMMUTABLE_CACHE_CONTROL
+    with COMPRESSION_CACHE_LOCK:
+        compressed_body = COMPRESSION_CACHE.get(cache_key) if cacheable else None
+        if compressed_body is not None:
+            COMPRESSION_CACHE.move_to_end(cache_key)
+    if compressed_body is None:
+        compressed_body = compress(body, encoding)
+        if cacheable:
+            with COMPRESSION_CACHE_LOCK:
+                COMPRESSION_CACHE[cache_key] = compressed_body
+                if len(COMPRESSION_CACHE) > COMPRESSION_CACHE_SIZE:
+                    COMPRESSION_CACHE.popitem(last=False)
+    response.set_data(compressed_body)
+    response.headers['Content-Encoding'] = encoding
+    if etag is not None:
+        # the compressed body is only semantically equal to the uncompressed one
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def multipart_frames(frames, episode, run):
+    """Pack a list of (step, png bytes) tuples into a multipart/mixed body.
+    Every part names the immutable url of its single frame in Content-Location.
+    """
+    body = bytearray()
+    for step, frame_raw in frames:
+        body += ("--{}\r\nContent-Type: image/png\r\nContent-Location: /frames/{}/{}.png?run={}\r\n"
+                 "Content-Length: {}\r\n\r\n").format(MULTIPART_BOUNDARY, episode, step, quote(run),
+                                                     len(frame_raw)).encode('ascii')
+        body += frame_raw
+        body += b"\r\n"
+    body += "--{}--\r\n".format(MULTIPART_BOUNDARY).encode('ascii')
+    return bytes(body)
+
+
+class QueryArgs:
+    """The parameters of a query of a batch request, which can be parsed like request.args"""
+
+    def __init__(self, query):
+        self.query = query
+
+    def get(self, key, default=None, type=None):
+        value = self.query.get(key)
+        if value is None:
+            return default
+        if type is None:
+            return value
+        try:
+            return type(value)
+        except (TypeError, ValueError):
+            abort(400, "Invalid query parameter " + key)
+
+
+def request_args(args=None):
+    """Return the arguments parsed by the argument helpers below
+    Params:
+        args: dict
+            The parameters of a batch query, None for the arguments of the current request
+    Returns:
+        request_args: MultiDict or QueryArgs
+    """
+    return request.args if args is None else QueryArgs(args)
+
+
+def int_arg(name, default=None, minimum=1, args=None):
+    """Parse an optional integer argument, which has to be at least minimum (0 or 1)"""
+    value = request_args(args).get(name, default=default, type=int)
+    if value is not None and value < minimum:
+        abort(400, name + (" has to be positive" if minimum > 0 else " must not be negative"))
+    return value
+
+
+def list_arg(name, args):
+    """Parse an optional list of strings of a batch query, which GET requests pass as
+    repeated or comma separated arguments"""
+    value = args.get(name)
+    if value is not None and (not isinstance(value, list) or not all(isinstance(item, str) for item in value)):
+        abort(400, name + " has to be a list of strings")
+    return value
+
+
+def scalar_args(args=None):
+    """Parse the trend smoother and the downsampling of scalar values from the request arguments
+    Params:
+        args: dict
+            Optional parameters of a batch query instead of the request arguments
+    Returns:
+        scalar_kwargs: dict
+            A dict with smoother, smoothing, max_points and downsampler for
+            DataPreprocessor.get_scalar_values_by_tag, see there for further info
+    """
+    query_args = request_args(args)
+    smoother = query_args.get('smoother', default='polyfit', type=str)
+    if smoother not in DataPreprocessor.SMOOTHERS:
+        abort(400, "Unknown smoother " + smoother)
+    downsampler = query_args.get('downsampler', default='lttb', type=str)
+    if downsampler not in DataPreprocessor.DOWNSAMPLERS:
+        abort(400, "Unknown downsampler " + downsampler)
+    smoothing = query_args.get('smoothing', default=None, type=float)
+    if smoothing is not None and smoother == 'ema' and not 0 < smoothing <= 1:
+        abort(400, "smoothing of ema has to be between 0 (exclusive) and 1")
+    if smoothing is not None and smoother != 'ema' and (not smoothing.is_integer() or smoothing < 1):
+        abort(400, "smoothing of " + smoother + " has to be a positive integer")
+    return {'smoother': smoother,
+            'smoothing': smoothing,
+            'max_points': int_arg('max_points', args=args),
+            'downsampler': downsampler}
+
+
+def scalar_values(tag):
+    """Return the scalar values of a tag with the trend and downsampling of the request arguments,
+    aborts with 400 for a smoothing larger than the number of values"""
+    try:
+        return preprocessor().get_scalar_values_by_tag(tag, **scalar_args())
+    except ValueError as error:
+        abort(400, str(error))
+
+
+def encoding_arg(args=None):
+    """Parse the optional array encoding from the request arguments
+    Params:
+        args: dict
+            Optional parameters of a batch query instead of the request arguments
+    Returns:
+        encoding: string
+            None or one of DataPreprocessor.ARRAY_ENCODINGS
+    """
+    encoding = request_args(args).get('encoding', default=None, type=str)
+    if encoding is not None and encoding not in DataPreprocessor.ARRAY_ENCODINGS:
+        abort(400, "Unknown encoding " + encoding)
+    return encoding
+
+
+def grid_size_arg(args=None):
+    """Parse the optional size of the aggregation grid of experiments from the request arguments
+    Params:
+        args: dict
+            Optional parameters of a batch query instead of the request arguments
+    Returns:
+        grid_size: int
+            The number of cells per dimension, defaults to 64
+    """
+    grid_size = request_args(args).get('grid_size', default=64, type=int)
+    if not 1 <= grid_size <= 1024:
+        abort(400, "grid_size must be between 1 and 1024")
+    return grid_size
+
+
+def distribution_args(args=None):
+    """Parse the episode range and the window aggregation of distributions from the request arguments
+    Params:
+        args: dict
+            Optional parameters of a batch query instead of the request arguments
+    Returns:
+        distribution_kwargs: dict
+            A dict with from_episode, to_episode, window, aggregate, columnar, rolling and
+            cumulative for DataPreprocessor.get_action_distributions, see there for further info
+    """
+    query_args = request_args(args)
+    aggregate = query_args.get('aggregate', default='sum', type=str)
+    if aggregate not in DataPreprocessor.DISTRIBUTION_AGGREGATES:
+        abort(400, "Unknown aggregate " + aggregate)
+    return {'from_episode': query_args.get('from_episode', default=None, type=int),
+            'to_episode': query_args.get('to_episode', default=None, type=int),
+            'window': int_arg('window', args=args),
+            'aggregate': aggregate,
+            'columnar': query_args.get('format', default=None, type=str) == 'columnar',
+            'rolling': int_arg('rolling', args=args),
+            'cumulative': flag_arg('cumulative', args)}
+
+
+def flag_arg(name, args=None):
+    """Parse a boolean flag like ?entropy=1 or ?entropy=true from the request arguments
+    or of a batch query"""
+    return request_args(args).get(name, default='false', type=str).lower() in ('1', 'true', 'yes')
+
+
+def memory_size(text):
+    """Parse a number of bytes with an optional unit like 512M or 2G for --memory-limit"""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def default_run():
+    """Return the run used when no run is requested: the event files directly
+    within the logdir (".") or else the first run"""
+    return '.' if '.' in data_preprocessors else min(data_preprocessors, default='.')
+
+
+def preprocessor():
+    """Return the data preprocessor of the run requested with ?run=
+    Returns:
+        data_preprocessor: DataPreprocessor
+            The data preprocessor of the requested run, aborts with 404 for unknown runs
+    """
+    run = request.args.get('run', default=default_run(), type=str)
+    if run not in data_preprocessors:
+        abort(404, "Unknown run " + run)
+    return data_preprocessors[run]
+
+
+def run_batch_query(query):
+    """Run a single query of a batch request
+    Params:
+        query: dict
+            A dict with the type of the query and its parameters, see BATCH_QUERIES,
+            and optionally the run to query
+    Returns:
+        result: dict
+            {"id": query id, "data": result} or {"id": query id, "error": message}
+    """
+    result = {'id': query.get('id')}
+    run = query.get('run', default_run())
+    if run not in data_preprocessors:
+        result['error'] = "Unknown run " + str(run)
+        return result
+    try:
+        result['data'] = BATCH_QUERIES[query['type']](data_preprocessors[run], query)
+    except HTTPException as error:
+        # raised by the argument helpers for invalid parameters
+        result['error'] = error.description
+    except KeyError as error:
+        result['error'] = "Missing or unknown query parameter " + str(error)
+    except (TypeError, ValueError) as error:
+        result['error'] = str(error)
+    return result
+
 
 #########
 # Serving
 #########
 
+data_preprocessors = {}
+
+
+def run_reloader(interval, log_dir, load_options):
+    """Periodically load newly logged data and new runs
+    Params:
+        interval: float
+            The seconds between two reloads
+        log_dir: string
+            The log directory containing the runs
+        load_options: dict
+            The keyword arguments of load_runs for new runs, e.g. the cache directory
+    """
+    global data_preprocessors
+    while True:
+        time.sleep(interval)
+        data_preprocessors = load_runs(log_dir, data_preprocessors=data_preprocessors, **load_options)
+
 
 @APP.route('/episode-rewards')
+@versioned(lambda: ['episode-rewards'])
 def get_episode_rewards():
     """Get Action Divergence data from log files
     Returns:
@@ -26,11 +445,12 @@ def get_episode_rewards():
             A dict containing episode rewards 
     """
 
-    chart_data = data_preprocessor.get_scalar_values_by_tag('episode-rewards')
+    chart_data = scalar_values('episode-rewards')
     return chart_data, 200, JSON_TYPE
 
 
 @APP.route('/action-divergences')
+@versioned(lambda: ['action-divergences'])
 def get_action_divergences():
     """Get Action Divergence data from log files
     Returns:
@@ -38,12 +458,12 @@ def get_action_divergences():
             A dict containing action_divergences    
     """
 
-    chart_data = data_preprocessor.get_scalar_values_by_tag(
-        'action-divergences')
+    chart_data = scalar_values('action-divergences')
     return chart_data, 200, JSON_TYPE
 
 
 @APP.route('/get-frames')
+@versioned(lambda: ['episode{}'.format(user_episode())], user_episode)
 def get_frames():
     """Get frames for an episode
     Params:
@@ -54,29 +474,115 @@ def get_frames():
             The frames for an episode per timestep
     """
     episode = int(request.args.get('user'))
-    frames = data_preprocessor.get_frames_for_episode(episode)
+    frames = preprocessor().get_frames_for_episode(episode)
     return frames, 200, JSON_TYPE
 
 
+@APP.route('/frames/<int:episode>/<int:step>.png')
+@versioned(lambda episode, step: ['episode{}'.format(episode)], lambda episode, step: episode)
+def get_frame(episode, step):
+    """Get a single frame as raw png. Frames of complete episodes are served
+    with an immutable Cache-Control, so the browser caches them forever.
+    Params:
+        episode: int
+            The episode in which the frame was logged
+        step: int
+            The timestep of the frame within the episode
+    Returns:
+        frame: image/png
+            The raw frame, 404 if it does not exist
+    """
+    frame = preprocessor().get_frame(episode, step)
+    if frame is None:
+        return {}, 404, JSON_TYPE
+    return Response(frame, mimetype='image/png')
+
+
+@APP.route('/frames/<int:episode>')
+@versioned(lambda episode: ['episode{}'.format(episode)], lambda episode: episode)
+def get_frame_batch(episode):
+    """Get a batch of frames for an episode as multipart/mixed of raw pngs
+    Params:
+        episode: int
+            The episode for which the frames shall be returned
+        from_step: int
+            The first timestep of the batch (inclusive), defaults to 0
+        to_step: int
+            The last timestep of the batch (inclusive), defaults to the end of the episode
+    Returns:
+        frames: multipart/mixed
+            One image/png part per timestep
+    """
+    from_step = request.args.get('from_step', default=0, type=int)
+    to_step = request.args.get('to_step', default=None, type=int)
+    frames = preprocessor().get_frames_in_range(episode, from_step, to_step)
+    return Response(multipart_frames(frames, episode, request.args.get('run', default=default_run())),
+                    mimetype='multipart/mixed; boundary=' + MULTIPART_BOUNDARY)
+
+
+@APP.route('/episode-animation/<int:episode>.<fmt>')
+@versioned(lambda episode, fmt: ['episode{}'.format(episode)], lambda episode, fmt: episode)
+def get_episode_animation(episode, fmt):
+    """Get the frames of an episode rendered into one animated image
+    Params:
+        episode: int
+            The episode which shall be rendered
+        fmt: string
+            The animation format, either webp or gif
+        from_step: int
+            The first timestep of the animation (inclusive), defaults to 0
+        to_step: int
+            The last timestep of the animation (inclusive), defaults to the end of the episode
+        fps: int
+            The frames per second of the animation, defaults to 30
+    Returns:
+        animation: image/webp or image/gif
+            The animated episode, 404 if there are no frames
+    """
+    if fmt not in DataPreprocessor.ANIMATION_FORMATS:
+        return {}, 404, JSON_TYPE
+    from_step = request.args.get('from_step', default=0, type=int)
+    to_step = request.args.get('to_step', default=None, type=int)
+    fps = max(1, request.args.get('fps', default=30, type=int))
+    animation = preprocessor().get_episode_animation(
+        episode, fmt, from_step, to_step, fps)
+    if animation is None:
+        return {}, 404, JSON_TYPE
+    return Response(animation, mimetype='image/' + fmt)
+
+
 @APP.route('/get-probs')
+@versioned(lambda: ['e{}'.format(user_episode()), 'action_meanings_'], user_episode)
 def get_probs():
     """Get probabilities of action selection for given action
     at given timestep
     Params:
         episode: int
             The episode for which the probabilities shall be returned
+        format: string
+            Optional columnar for one [timesteps, actions] matrix and
+            the action names once instead of dicts per action and timestep
+        encoding: string
+            Optional float32 or float16 for base64 encoded buffers, implies columnar
+        entropy: bool
+            Whether to add the entropy per timestep (columnar only)
+        argmax: bool
+            Whether to add the most probable action per timestep (columnar only)
     Returns:
         probs: dict
             The probabilities of selecting an action per action
             for the given episode per timestep
     """
     episode = int(request.args.get('user'))
-    probs = data_preprocessor.get_probs_for_episode(episode)
+    columnar = request.args.get('format', default=None, type=str) == 'columnar'
+    probs = preprocessor().get_probs_for_episode(
+        episode, columnar, encoding_arg(), flag_arg('entropy'), flag_arg('argmax'))
 
     return probs, 200, JSON_TYPE
 
 
 @APP.route('/get-rewards')
+@versioned(lambda: ['reward-e{}'.format(user_episode())], user_episode)
 def get_rewards():
     """Get rewards for all timesteps in an episode
     Params:
@@ -87,12 +593,12 @@ def get_rewards():
                 The rewards for each timestep in the requested episode
     """
     episode = int(request.args.get('user'))
-    rewards = data_preprocessor.get_scalar_values_by_tag(
-        "reward-e"+str(episode))
+    rewards = scalar_values("reward-e"+str(episode))
     return rewards, 200, JSON_TYPE
 
 
 @APP.route('/get-experiment-random-states-data')
+@versioned()
 def get_experiment_random_states_data():
     """Get the data for random states experiment
 
@@ -100,64 +606,225 @@ def get_experiment_random_states_data():
         episode: int
             The episode for which the data of an
             experiment instance shall be returned
+        encoding: string
+            Optional float32 or float16 for one base64 encoded buffer
+            per column instead of row wise values
+        max_points: int
+            Optional maximum number of returned samples, larger
+            experiments are aggregated into the cells of a grid
+        grid_size: int
+            Optional number of cells per dimension of the grid, defaults to 64
     Returns:
         exp_data: dict
             The experiment data. For further explanation
             see the docs in data_preprocessor
     """
     episode = int(request.args.get('user'))
-    exp_data = data_preprocessor.get_experiment_random_states_tensors(episode)
+    encoding = encoding_arg()
+    max_points = int_arg('max_points')
+    exp_data = preprocessor().get_experiment_random_states_tensors(
+        episode, encoding, max_points, grid_size_arg())
 
     return exp_data, 200, JSON_TYPE
 
 
+@APP.route('/experiment-random-states/<int:episode>/cell/<int:cell_x>/<int:cell_y>')
+@versioned(lambda episode, **_: ['experiment-episode-{}'.format(episode)])
+def get_experiment_cell_points(episode, cell_x, cell_y):
+    """Get the samples of a random states experiment within one cell
+    of the aggregation grid, to drill down into an aggregated experiment
+    Params:
+        episode: int
+            The episode in which the random states experiment was held
+        cell_x: int
+            The cell along the first reduced dimension
+        cell_y: int
+            The cell along the second reduced dimension
+        grid_size: int
+            Optional number of cells per dimension of the grid, defaults to 64
+        encoding: string
+            Optional float32 or float16 for one base64 encoded buffer
+            per column instead of row wise values
+    Returns:
+        cell_data: dict
+            The sample indices and values of the samples in the cell
+    """
+    cell_data = preprocessor().get_experiment_cell_points(
+        episode, cell_x, cell_y, grid_size_arg(), encoding_arg())
+    return cell_data, 200, JSON_TYPE
+
+
 @APP.route("/get-confidence-frame")
+@versioned(lambda: ['random-state-ep-{}'.format(int(request.args.get('user').split(",")[0]))], immutable=True)
 def get_confidence_frame():
     user = request.args.get('user').split(",")
     episode_num = int(user[0])
     index = int(user[1])
-    frames = data_preprocessor.get_confidence_frames(episode_num, index)
+    frames = preprocessor().get_confidence_frames(episode_num, index)
     return frames, 200, JSON_TYPE
 
 
+@APP.route("/confidence-frames/<int:episode>/<int:index>.png")
+@versioned(lambda episode, index: ['random-state-ep-{}'.format(episode)], immutable=True)
+def get_confidence_frame_png(episode, index):
+    """Get the image of a single random state sample as raw png. Experiments
+    are logged at once, so the image never changes.
+    Params:
+        episode: int
+            The episode in which the random states experiment was held
+        index: int
+            The index of the sample in the experiment
+    Returns:
+        frame: image/png
+            The raw state image, 404 if it does not exist
+    """
+    frame = preprocessor().get_confidence_frame(episode, index)
+    if frame is None:
+        return {}, 404, JSON_TYPE
+    return Response(frame, mimetype='image/png')
+
+
+@APP.route("/confidence-frames/<int:episode>")
+@versioned(lambda episode: ['random-state-ep-{}'.format(episode)])
+def get_confidence_frames_batch(episode):
+    """Get the images of many random state samples of an experiment in one call,
+    e.g. ?indices=0,5,17
+    Params:
+        episode: int
+            The episode in which the random states experiment was held
+        indices: string
+            The comma separated indices of the samples in the experiment
+        size: int
+            Optional thumbnail size to return thumbnails instead of
+            the full size images, see /confidence-thumbnails
+    Returns:
+        frames: dict
+            The base64 encoded png per existing sample index
+    """
+    try:
+        indices = [int(index) for index in request.args.get('indices', '').split(',') if index]
+    except ValueError:
+        abort(400, "indices must be comma separated integers")
+    try:
+        frames = preprocessor().get_confidence_frames_batch(
+            episode, indices, request.args.get('size', default=None, type=int))
+    except ValueError as error:
+        abort(400, str(error))
+    return frames, 200, JSON_TYPE
+
+
+@APP.route("/confidence-thumbnails/<int:episode>/<int:size>/<int:index>.png")
+@versioned(lambda episode, size, index: ['random-state-ep-{}'.format(episode)], immutable=True)
+def get_confidence_thumbnail_png(episode, size, index):
+    """Get a downscaled image of a single random state sample as raw png. Thumbnails
+    are rendered on their first request and never change.
+    Params:
+        episode: int
+            The episode in which the random states experiment was held
+        size: int
+            The maximum edge length of the thumbnail, one of 16, 32, 48 or 64
+        index: int
+            The index of the sample in the experiment
+    Returns:
+        thumbnail: image/png
+            The raw thumbnail, 404 if it does not exist
+    """
+    if size not in DataPreprocessor.THUMBNAIL_SIZES:
+        return {}, 404, JSON_TYPE
+    thumbnail = preprocessor().get_confidence_thumbnail(episode, index, size)
+    if thumbnail is None:
+        return {}, 404, JSON_TYPE
+    return Response(thumbnail, mimetype='image/png')
+
+
 @APP.route("/get-confidence-exp-first-episode")
+@versioned()
 def get_confident_exp_first_episode():
-    episode = data_preprocessor.get_first_confidence_experiment_episode()
+    episode = preprocessor().get_first_confidence_experiment_episode()
     return {"episode": episode}, 200, JSON_TYPE
 
 
 @APP.route('/get-action-distributions')
+@versioned(lambda: ['action_distributions'])
 def get_action_distributions():
     """Get the distribution of actions. (Count of number of times in which
     an individual action was selected)
+    Params:
+        from_episode: int
+            Optional first episode of the returned range
+        to_episode: int
+            Optional last episode (inclusive) of the returned range
+        window: int
+            Optional number of episodes aggregated into one, e.g. 100
+        aggregate: string
+            sum (default) or mean of the counts within a window
+        format: string
+            Optional columnar for one [episodes, actions] count matrix
+        rolling: int
+            Optional number of episodes, returns the counts of the last rolling episodes
+            up to every episode (or window)
+        cumulative: bool
+            Whether to return the counts of all episodes up to every episode (or window)
     Returns:
         action_distributions: dict
-            The actions distribution per episode
+            The actions distribution per episode (or window)
     """
 
-    action_distributions = data_preprocessor.get_action_distributions()
+    action_distributions = preprocessor().get_action_distributions(**distribution_args())
 
     return action_distributions, 200, JSON_TYPE
 
 
 @APP.route('/get-weights-for-episode')
+@versioned(lambda: ['weights-episode-{}'.format(user_episode())], user_episode)
 def get_weights_for_episode():
     """Get weight matrix for an episode
     Params:
         episode: int
             The episode for which the weight matrices per timestep
             shall be returned
+        encoding: string
+            Optional float32 or float16 for one base64 encoded [timesteps, rows, cols]
+            buffer instead of dicts per weight
+        timestep: int
+            Optional index of the only timestep to return
     Returns:
         weights_for_episode: dict
             The weight matrices per timestep of a requested episode
     """
     episode = int(request.args.get('user'))
-    weights_for_episode = data_preprocessor.get_weights_for_episode(episode)
+    encoding = encoding_arg()
+    timestep = int_arg('timestep', minimum=0)
+    weights_for_episode = preprocessor().get_weights_for_episode(
+        episode, encoding, timestep)
 
     return weights_for_episode, 200, JSON_TYPE
 
 
+@APP.route('/get-weight-summaries')
+@versioned(lambda: ['weights-episode-{}'.format(user_episode())], user_episode)
+def get_weight_summaries():
+    """Get a summary of the weight development in an episode: norms, changes
+    between timesteps and the most changed weights per timestep
+    Params:
+        episode: int
+            The episode for which the summary shall be returned
+        top_k: int
+            The number of most changed weights per timestep, defaults to 10
+    Returns:
+        weight_summaries: dict
+            The weight summaries per timestep, see DataPreprocessor.get_weight_summaries
+            for further info
+    """
+    episode = int(request.args.get('user'))
+    top_k = int_arg('top_k', 10)
+    weight_summaries = preprocessor().get_weight_summaries(episode, top_k)
+
+    return weight_summaries, 200, JSON_TYPE
+
+
 @APP.route('/get-action-meanings')
+@versioned(lambda: ['action_meanings_'])
 def get_action_meanings():
     """Get the meanings of given actions
     Returns:
@@ -165,12 +832,13 @@ def get_action_meanings():
             A dict containing a list of names/meanings
             for all actions
     """
-    action_meanings = data_preprocessor.get_action_meanings()
+    action_meanings = preprocessor().get_action_meanings()
 
     return action_meanings, 200, JSON_TYPE
 
 
 @APP.route('/get-log-tags')
+@versioned()
 def get_log_tags():
     """Return all tags which were created in the logging process for
     scalar values
@@ -179,12 +847,13 @@ def get_log_tags():
             A dict of a list of tags used during logging to log scalar values
             most commonly in episode value format
     """
-    log_tags = data_preprocessor.get_log_tags()
+    log_tags = preprocessor().get_log_tags()
 
     return log_tags, 200, JSON_TYPE
 
 
 @APP.route("/get-tag-scalars")
+@versioned(lambda: [request.args.get('user')])
 def get_tag_scalars():
     """Return the values logged under a certain log tag.
     Params:
@@ -197,35 +866,213 @@ def get_tag_scalars():
             Form {step:[val,polyfittrend]}
     """
     tag = str(request.args.get('user'))
-    scalars_tag = data_preprocessor.get_scalar_values_by_tag(tag)
+    scalars_tag = scalar_values(tag)
 
     return scalars_tag, 200, JSON_TYPE
 
 
+@APP.route("/scalar-range")
+@versioned(lambda: [request.args.get('tag')])
+def get_scalar_range():
+    """Return aggregated values of a step range of a logged tag for zoomable charts.
+    Params:
+        tag: string
+            The tag for which the data shall be returned.
+        from_step: int
+            The first step of the range (inclusive), defaults to the first logged step
+        to_step: int
+            The last step of the range (inclusive), defaults to the last logged step
+        max_points: int
+            The maximum number of returned buckets, defaults to 1000
+
+    Returns:
+        scalar_range: dict
+            A dict containing min, max, mean and count per bucket of values,
+            see DataPreprocessor.get_scalar_range for further info
+    """
+    tag = request.args.get('tag', type=str)
+    if tag is None:
+        abort(400, "tag is required")
+    from_step = request.args.get('from_step', default=None, type=int)
+    to_step = request.args.get('to_step', default=None, type=int)
+    max_points = int_arg('max_points', 1000)
+    scalar_range = preprocessor().get_scalar_range(
+        tag, from_step, to_step, max_points)
+
+    return scalar_range, 200, JSON_TYPE
+
+
+@APP.route("/tag-index")
+@versioned()
+def get_tag_index():
+    """Return the index of all logged tags: scalar tags with their last step, timestep level
+    metrics with the episodes they were logged in, episodes with frames and all plugins.
+    Returns:
+        tag_index: dict
+            The tag index, see DataPreprocessor.get_tag_index for further info
+    """
+    tag_index = preprocessor().get_tag_index()
+    return tag_index, 200, JSON_TYPE
+
+
+@APP.route("/episode-table")
+@versioned()
+def get_episode_table():
+    """Return a page of the table with one row of facts per episode, e.g. to find
+    the 10 episodes with the lowest return: ?sort_by=return&limit=10
+    Params:
+        columns: string
+            Optional comma separated names of the returned columns, all by default
+        sort_by: string
+            The column the rows are sorted by, episode by default
+        descending: bool
+            Whether to sort in descending order
+        offset: int
+            The number of sorted rows to skip
+        limit: int
+            The maximum number of rows, 100 by default
+        from_episode: int
+            Optional first episode of the table
+        to_episode: int
+            Optional last episode (inclusive) of the table
+        where: string
+            Optional predicates the rows have to match, see query_episodes
+    Returns:
+        episode_table: dict
+            The columns, the rows and the total number of rows,
+            see DataPreprocessor.get_episode_table for further info
+    """
+    columns = request.args.get('columns', default=None, type=str)
+    offset = int_arg('offset', 0, minimum=0)
+    limit = int_arg('limit', 100, minimum=0)
+    try:
+        episode_table = preprocessor().get_episode_table(
+            None if columns is None else columns.split(','),
+            request.args.get('sort_by', default='episode', type=str), flag_arg('descending'),
+            offset, limit, request.args.get('from_episode', default=None, type=int),
+            request.args.get('to_episode', default=None, type=int), request.args.getlist('where'))
+    except ValueError as error:
+        abort(400, str(error))
+    return episode_table, 200, JSON_TYPE
+
+
+@APP.route("/query-episodes")
+@versioned()
+def query_episodes():
+    """Return the episodes matching all given predicates on the columns of the episode
+    table, e.g. ?where=return>10&where=length<200&from_episode=1000
+    Params:
+        where: string
+            A predicate of the form {column}{operator}{number} with one of the operators
+            <, <=, >, >=, == and !=, can be given several times
+        from_episode: int
+            Optional first episode
+        to_episode: int
+            Optional last episode (inclusive)
+        limit: int
+            Optional maximum number of returned episodes
+    Returns:
+        episodes: dict
+            The sorted matching episodes and their total number,
+            see DataPreprocessor.query_episodes for further info
+    """
+    limit = int_arg('limit', minimum=0)
+    try:
+        episodes = preprocessor().query_episodes(
+            request.args.getlist('where'), request.args.get('from_episode', default=None, type=int),
+            request.args.get('to_episode', default=None, type=int), limit)
+    except ValueError as error:
+        abort(400, str(error))
+    return episodes, 200, JSON_TYPE
+
+
+@APP.route("/memory-usage")
+def get_memory_usage():
+    """Return the approximate memory held by decoded data of all runs and how much was
+    spilled to disk to stay within --memory-limit.
+    Returns:
+        memory_usage: dict
+            The memory usage, see MemoryBudget.get_usage for further info
+    """
+    memory_usage = preprocessor().get_memory_usage()
+    return memory_usage, 200, JSON_TYPE
+
+
+@APP.route("/runs")
+@versioned(lambda: [], runs=lambda: sorted(data_preprocessors))
+def get_runs():
+    """Return the names of all runs in the logdir. Every endpoint accepts
+    ?run=<name> to select a run, the default run is "." (event files
+    directly within the logdir) or else the first run.
+    Returns:
+        runs: dict
+            A dict of the form {"runs": list(string), "defaultRun": string}
+    """
+    return {'runs': sorted(data_preprocessors), 'defaultRun': default_run()}, 200, JSON_TYPE
+
+
+@APP.route("/compare-runs")
+@versioned(lambda: [request.args.get('tag', type=str)], runs=lambda: compared_runs())
+def get_compare_runs():
+    """Return the values of a logged tag for several runs aligned by step.
+    Params:
+        tag: string
+            The tag for which the data shall be returned.
+        runs: string
+            Comma separated names of the runs, defaults to all runs
+        max_points: int
+            Optional maximum number of steps, the values are then averaged in
+            equally wide step bins
+
+    Returns:
+        aligned: dict
+            A dict of the form {"steps": list, "runs": {run: list}}, see
+            compare_runs in data_preprocessor for further info
+    """
+    tag = request.args.get('tag', type=str)
+    if tag is None:
+        abort(400, "tag is required")
+    runs = compared_runs()
+    unknown_runs = [run for run in runs if run not in data_preprocessors]
+    if unknown_runs:
+        abort(404, "Unknown runs " + ",".join(unknown_runs))
+    max_points = int_arg('max_points')
+    aligned = compare_runs({run: data_preprocessors[run] for run in runs}, tag, max_points)
+    return aligned, 200, JSON_TYPE
+
+
 @APP.route("/get-timestep-log-tags")
+@versioned()
 def get_timestep_log_tags():
     """Return a list of all log tags from timestep level logged scalars e.g. rewards, q-values,...APP
     Returns:
         timestep_log_tags:
             A dict containing the queried log tags on a timestep level. see Datapreprocessor for further info.
     """
-    timestep_log_tags = data_preprocessor.get_timestep_log_tags()
+    timestep_log_tags = preprocessor().get_timestep_log_tags()
     return timestep_log_tags, 200, JSON_TYPE
 
 
 @APP.route("/get-custom-distribution")
+@versioned(lambda: [request.args.get('user')])
 def get_custom_distribution():
     """Get the distribution of a custom value. (Count of number of times in which
     an individual value was selected/received/encountered)
+    Params:
+        user: string
+            The tag of the distribution
+        from_episode, to_episode, window, aggregate, format, rolling, cumulative:
+            See get_action_distributions
     Returns:
         custom_distributions: dict
-            The custom distribution per episode for a specific value"""
+            The custom distribution per episode (or window) for a specific value"""
     tag = str(request.args.get("user"))
-    custom_distributions = data_preprocessor.get_custom_distributions(tag)
+    custom_distributions = preprocessor().get_custom_distributions(tag, **distribution_args())
     return custom_distributions, 200, JSON_TYPE
 
 
 @APP.route("/get-distribution-log-tags")
+@versioned()
 def get_distribution_log_tags():
     """Get the log tags which are related to logged distribution values
 
@@ -234,18 +1081,58 @@ def get_distribution_log_tags():
             A dict containing a list of all log tags related to logged distributions (of e.g. actions
             ,rewards)    
     """
-    distrib_log_tags = data_preprocessor.get_distribution_tags()
+    distrib_log_tags = preprocessor().get_distribution_tags()
     return distrib_log_tags, 200, JSON_TYPE
 
+@APP.route('/batch', methods=['POST'])
+def get_batch():
+    """Run several queries at once, e.g. for loading all charts of a view in one request.
+    The queries are answered concurrently.
+    Params:
+        queries: list
+            The JSON body of the form {"queries": [{"id": any, "type": string, ...params}]},
+            where type is one of BATCH_QUERIES and the params are the ones of the
+            corresponding endpoint, e.g. {"id": 0, "type": "scalars", "tag": "loss", "max_points": 500}
+    Returns:
+        results: dict
+            A dict of the form {"results": [{"id": any, "data": result}, ...]} in the order of
+            the queries. A failed query has an error message instead of data.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('queries'), list):
+        abort(400, "Expected a JSON body of the form {\"queries\": [...]}")
+    queries = [query if isinstance(query, dict) else {} for query in body['queries']]
+    results = list(BATCH_EXECUTOR.map(run_batch_query, queries))
+    return {'results': results}, 200, JSON_TYPE
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--logdir", type=str, default="backend/logs")
+    parser.add_argument("--cache-dir", type=str, default=None)
+    parser.add_argument("--reload-interval", type=float, default=0)
+    parser.add_argument("--load-workers", type=int, default=1)
+    parser.add_argument("--backend", type=str, default=None, choices=sorted(BACKENDS))
+    parser.add_argument("--memory-limit", type=memory_size, default=None)
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
     args = parser.parse_args()
+    if args.memory_limit is not None and args.backend not in (None, 'columnar'):
+        # the other backends keep all data in memory
+        parser.error("--memory-limit requires the columnar backend")
 
     #os.system("cd dist; python3 -m http.server 8000 &")
 
     starttime = timeit.default_timer()
-    data_preprocessor = DataPreprocessor(args.logdir)
-    print("Time for start:", (timeit.default_timer() - starttime), "s")
-    APP.run(debug=True)
+    load_options = {'cache_dir': args.cache_dir, 'load_workers': args.load_workers,
+                    'backend': args.backend, 'memory_budget': MemoryBudget(args.memory_limit, args.cache_dir)}
+    data_preprocessors = load_runs(args.logdir, **load_options)
+    print("Time for start:", (timeit.default_timer() - starttime), "s,", len(data_preprocessors), "run(s)")
+    if args.reload_interval > 0:
+        Thread(target=run_reloader, args=(args.reload_interval, args.logdir, load_options),
+               daemon=True).start()
+    if args.threads > 0:
+        waitress.serve(APP, host=args.host, port=args.port, threads=args.threads)
+    else:
+        APP.run(debug=False, host=args.host, port=args.port)